@@ -4,21 +4,36 @@ import os
 env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
 load_dotenv(dotenv_path=env_path)
 
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, Response, stream_with_context
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
 from flask_migrate import Migrate
 from flask_cors import CORS
 from functools import wraps
 from models import db, Chat, ChatMessage, User
-from infermedica_conversation import infermedica_conversational_flow
+from infermedica_conversation import infermedica_conversational_flow, infermedica_diagnosis
 from werkzeug.security import generate_password_hash, check_password_hash
-from utils import detect_language, translate_to_english, extract_text_from_pdf
-from openai_client import get_openai_response
+from utils import detect_language, translate_to_english
+from extraction_cache import extract_text_cached
+import extraction_cache
+import extraction_jobs
+import tts as tts_cache
+import infermedica_client
+import symptom_index
+from uploads import receive_upload, UploadRejected
+from openai_client import get_openai_response, stream_openai_response, is_acceptable_response
+import openai_client
+import completion_cache
+import similarity_cache
+from similarity_cache import SimilarAnswer
+import click
 import datetime
 import logging
-import tempfile
-import uuid
-from gtts import gTTS
+import copy
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FutureTimeoutError
 
 app = Flask(__name__)
 CORS(app)
@@ -40,12 +55,38 @@ app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
     'max_overflow': 10      # Allow temporary connection bursts
 }
 
+# Whole-request cap; per-file limits are applied in uploads.receive_upload
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('UPLOAD_MAX_REQUEST_BYTES', str(100 * 1024 * 1024)))
+
 logging.basicConfig(level=logging.INFO)
 
 db.init_app(app)
 migrate = Migrate(app, db)
 jwt = JWTManager(app)
 
+# Chat response engines: "serial" only calls Infermedica after OpenAI has
+# declined to answer. "concurrent" starts Infermedica alongside OpenAI, which
+# saves the OpenAI round trip when it declines, at the price of a metered
+# Infermedica /parse call for most messages that OpenAI does answer
+CHAT_RESPONSE_MODE = os.getenv('CHAT_RESPONSE_MODE', 'serial').lower()
+OPENAI_TIMEOUT = float(os.getenv('OPENAI_TIMEOUT', '25'))
+INFERMEDICA_TIMEOUT = float(os.getenv('INFERMEDICA_TIMEOUT', '10'))
+fanout_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('CHAT_FANOUT_WORKERS', '8')),
+    thread_name_prefix='chat-fanout'
+)
+
+# Upper bound for extraction job long-polls, kept below the proxy timeout
+EXTRACT_JOB_MAX_WAIT = float(os.getenv('EXTRACT_JOB_MAX_WAIT', '20'))
+# Files of one batch extraction request processed at the same time
+EXTRACT_BATCH_CONCURRENCY = int(os.getenv('EXTRACT_BATCH_CONCURRENCY', str(min(os.cpu_count() or 1, 4))))
+EXTRACT_BATCH_MAX_FILES = int(os.getenv('EXTRACT_BATCH_MAX_FILES', '10'))
+
+# Browser cache lifetime of served TTS audio (one year)
+TTS_AUDIO_MAX_AGE = 365 * 24 * 3600
+# Longest wait for one sentence of speech while streaming a spoken reply
+SPEAK_SEGMENT_TIMEOUT = float(os.getenv('SPEAK_SEGMENT_TIMEOUT', '20'))
+
 # Add root and favicon routes to handle 404 errors
 @app.route("/")
 def index():
@@ -144,9 +185,12 @@ def get_chat(user_id, chat_id):
         return jsonify({"error": "Unauthorized"}), 403
     messages = [
         {
+            "id": m.id,
             "sender": m.sender,
             "content": m.content,
-            "created_at": m.created_at.isoformat()
+            "created_at": m.created_at.isoformat(),
+            # Set once background synthesis has finished, and while the file is not evicted
+            "audio_url": audio_url_for(m.audio_file) if tts_cache.is_cached(m.audio_file) else None
         }
         for m in sorted(chat.messages, key=lambda m: m.created_at)
     ]
@@ -172,6 +216,109 @@ def patch_chat(user_id, chat_id):
         db.session.commit()
     return jsonify({"id": chat.id, "title": chat.title})
 
+# --- Chat Response Engines ---
+def similar_to(message):
+    """The question a reused answer was given for, or None for a fresh answer."""
+    return message.match() if isinstance(message, SimilarAnswer) else None
+
+def use_completion_cache(data):
+    """False when the request asks for a fresh completion, with "cache": false or Cache-Control: no-cache."""
+    if data.get('cache') is False:
+        return False
+    return 'no-cache' not in request.headers.get('Cache-Control', '')
+
+def get_serial_response(state, content, context=None, answers_dict=None, callback=None, use_cache=True):
+    """
+    Ask OpenAI first and only start the Infermedica flow once OpenAI has
+    declined to answer.
+
+    Returns:
+        tuple: (ai_message, followup, new_state)
+    """
+    followup = None
+    new_state = None
+    openai_response = get_openai_response(content, timeout=OPENAI_TIMEOUT, use_cache=use_cache)
+    if is_acceptable_response(openai_response):
+        return openai_response, followup, new_state
+
+    # If OpenAI response is not suitable, try infermedica. It records the
+    # symptoms it finds in its copy of the state, which is returned to be saved
+    infermedica_state = copy.deepcopy(state or {})
+    infermedica_response = infermedica_conversational_flow(
+        infermedica_state,
+        content,
+        context=context,
+        answers_dict=answers_dict,
+        callback=callback
+    )
+    if isinstance(infermedica_response, dict):
+        followup = infermedica_response
+        new_state = infermedica_response.get('state')
+        return infermedica_response.get('text', ''), followup, new_state
+    if infermedica_state.get('evidence'):
+        new_state = infermedica_state
+    return infermedica_response, followup, new_state
+
+def get_concurrent_response(state, content, context=None, answers_dict=None, callback=None, use_cache=True):
+    """
+    Start OpenAI and the Infermedica parse/diagnosis path at the same time.
+
+    The refusal-phrase rules are unchanged: an acceptable OpenAI answer wins
+    and the Infermedica path skips its remaining calls, otherwise the
+    Infermedica diagnosis is used, falling back to whatever OpenAI returned.
+    Each engine is bounded by its own timeout so a slow upstream cannot hold
+    the worker for longer than OPENAI_TIMEOUT/INFERMEDICA_TIMEOUT. Answers to
+    an Infermedica follow-up question go through get_serial_response, whose
+    conversational flow handles them.
+
+    Returns:
+        tuple: (ai_message, followup, new_state), as get_serial_response
+    """
+    if answers_dict or callback:
+        return get_serial_response(state, content, context, answers_dict, callback, use_cache=use_cache)
+
+    started = time.monotonic()
+    openai_answered = threading.Event()
+    openai_future = fanout_executor.submit(get_openai_response, content, timeout=OPENAI_TIMEOUT, use_cache=use_cache)
+    # The Infermedica path records evidence in the state, so give it its own copy
+    infermedica_state = copy.deepcopy(state or {})
+    infermedica_future = fanout_executor.submit(
+        infermedica_diagnosis, infermedica_state, content,
+        timeout=INFERMEDICA_TIMEOUT, should_stop=openai_answered.is_set
+    )
+
+    openai_response = None
+    try:
+        openai_response = openai_future.result(timeout=OPENAI_TIMEOUT)
+    except FutureTimeoutError:
+        logging.warning(f"OpenAI did not answer within {OPENAI_TIMEOUT}s")
+    except Exception as e:
+        logging.error(f"OpenAI engine error: {str(e)}")
+
+    if is_acceptable_response(openai_response):
+        # A call already in flight finishes, but no further one is made
+        openai_answered.set()
+        return openai_response, None, None
+
+    infermedica_response = None
+    remaining = max(INFERMEDICA_TIMEOUT - (time.monotonic() - started), 0)
+    try:
+        infermedica_response = infermedica_future.result(timeout=remaining)
+    except FutureTimeoutError:
+        logging.warning(f"Infermedica did not answer within {INFERMEDICA_TIMEOUT}s")
+    except Exception as e:
+        logging.error(f"Infermedica engine error: {str(e)}")
+
+    if infermedica_response:
+        return infermedica_response, None, infermedica_state
+    if openai_response:
+        return openai_response, None, None
+    return (
+        "I apologize, but I couldn't provide a specific diagnosis. Please consult with a healthcare professional for proper medical advice.",
+        None,
+        None
+    )
+
 # --- Send Message Endpoint ---
 @app.route('/api/chats/<int:chat_id>/message', methods=['POST'])
 @jwt_required()
@@ -187,6 +334,7 @@ def send_message(chat_id):
         context = data.get('context', [])
         answers_dict = data.get('answers')
         callback = data.get('callback')
+        use_cache = use_completion_cache(data)
         
         logging.info(f"Received message request - Content: {content}")
         logging.info(f"Context: {context}")
@@ -206,27 +354,10 @@ def send_message(chat_id):
         new_state = None
         
         try:
-            # First try to get response from OpenAI
-            openai_response = get_openai_response(content)
-            if openai_response and not any(phrase in openai_response.lower() for phrase in ["i don't know", "i'm sorry", "i am not sure", "as an ai", "i cannot"]):
-                ai_message = openai_response
-            else:
-                # If OpenAI response is not suitable, try infermedica
-                infermedica_response = infermedica_conversational_flow(
-                    chat.state or {},
-                    content,
-                    context=context,
-                    answers_dict=answers_dict,
-                    callback=callback
-                )
-                
-                if isinstance(infermedica_response, dict):
-                    ai_message = infermedica_response.get('text', '')
-                    followup = infermedica_response
-                    if 'state' in infermedica_response:
-                        new_state = infermedica_response['state']
-                else:
-                    ai_message = infermedica_response
+            get_response = get_concurrent_response if CHAT_RESPONSE_MODE == 'concurrent' else get_serial_response
+            ai_message, followup, new_state = get_response(
+                chat.state, content, context, answers_dict, callback, use_cache=use_cache
+            )
         except Exception as e:
             logging.error(f"Error getting AI response: {str(e)}")
             ai_message = "I'm having trouble processing your request right now. Please try again in a moment."
@@ -249,6 +380,7 @@ def send_message(chat_id):
             chat.state = new_state
         chat.updated_at = datetime.datetime.now(datetime.UTC)
         db.session.commit()
+        pregenerate_message_audio(ai_message_obj.id, ai_message)
         
         response_data = {
             'ai_message': ai_message,
@@ -256,7 +388,8 @@ def send_message(chat_id):
             'raw_message': ai_message,
             'followup': followup,
             'callback': callback,
-            'is_question': bool(followup)
+            'is_question': bool(followup),
+            'similar_to': similar_to(ai_message)
         }
         
         logging.info(f"Sending response: {response_data}")
@@ -266,6 +399,140 @@ def send_message(chat_id):
         logging.error(f"Error in send_message: {str(e)}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
+# --- Streaming Send Message Endpoint ---
+def sse_event(data, event=None):
+    """Format a Server-Sent Event frame carrying a JSON payload."""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(data)}\n\n"
+
+@app.route('/api/chats/<int:chat_id>/message/stream', methods=['POST'])
+@jwt_required()
+def stream_message(chat_id):
+    """
+    Streaming variant of send_message. OpenAI deltas are relayed as
+    Server-Sent Events while they are generated:
+
+        data: {"delta": "..."}                 one per OpenAI delta
+        event: replace / data: {"text": ...}   the streamed answer was declined
+                                               and replaced by Infermedica
+        event: audio / data: {"index", "text", "audio_url"}
+                                               with "speak": true, speech for each
+                                               sentence as soon as it is synthesized
+        event: done / data: {...}              final message, after it is saved
+        event: error / data: {"error": ...}    the stream failed
+
+    The AI ChatMessage is only persisted once the stream has completed.
+    After a replace event, audio events carry the replacement text.
+    """
+    chat = Chat.query.get_or_404(chat_id)
+    user_id = str(get_jwt_identity())
+    if str(chat.user_id) != user_id:
+        return jsonify({"error": "Unauthorized"}), 403
+
+    data = request.get_json()
+    content = data.get('content', '')
+    callback = data.get('callback')
+    speak = bool(data.get('speak'))
+    use_cache = use_completion_cache(data)
+    state = copy.deepcopy(chat.state or {})
+    logging.info(f"Received streaming message request - Content: {content}")
+
+    def audio_event(segment):
+        return sse_event({
+            "index": segment["index"],
+            "text": segment["text"],
+            "audio_url": audio_url_for(segment['filename'])
+        }, event="audio")
+
+    def generate():
+        parts = []
+        similar = None
+        # Voices each sentence while the rest of the answer is generated
+        speaker = tts_cache.SentenceSpeaker() if speak else None
+        # Same fan-out as send_message: Infermedica runs while OpenAI streams
+        infermedica_future = None
+        openai_answered = threading.Event()
+        if CHAT_RESPONSE_MODE == 'concurrent':
+            infermedica_future = fanout_executor.submit(
+                infermedica_diagnosis, state, content,
+                timeout=INFERMEDICA_TIMEOUT, should_stop=openai_answered.is_set
+            )
+        try:
+            for delta in stream_openai_response(content, timeout=OPENAI_TIMEOUT, use_cache=use_cache):
+                similar = similar or similar_to(delta)
+                parts.append(delta)
+                yield sse_event({"delta": delta})
+                if speaker:
+                    speaker.feed(delta)
+                    for segment in speaker.ready():
+                        yield audio_event(segment)
+        except Exception as e:
+            logging.error(f"OpenAI streaming error: {str(e)}")
+
+        ai_message = "".join(parts).strip()
+        new_state = None
+        if is_acceptable_response(ai_message):
+            openai_answered.set()
+        else:
+            infermedica_response = None
+            try:
+                if infermedica_future:
+                    infermedica_response = infermedica_future.result(timeout=INFERMEDICA_TIMEOUT)
+                else:
+                    infermedica_response = infermedica_diagnosis(state, content, timeout=INFERMEDICA_TIMEOUT)
+            except Exception as e:
+                logging.error(f"Infermedica engine error: {str(e)}")
+            if infermedica_response:
+                ai_message = infermedica_response
+                new_state = state
+                similar = None
+                yield sse_event({"text": ai_message}, event="replace")
+                if speaker:
+                    speaker.cancel()
+                    speaker.feed(ai_message)
+
+        if not ai_message:
+            ai_message = "I apologize, but I couldn't generate a response. Please try again."
+            yield sse_event({"text": ai_message}, event="replace")
+            if speaker:
+                speaker.cancel()
+                speaker.feed(ai_message)
+
+        try:
+            ai_message_obj = ChatMessage(chat_id=chat_id, content=ai_message, sender='ai')
+            db.session.add(ChatMessage(chat_id=chat_id, content=content, sender='user'))
+            db.session.add(ai_message_obj)
+            if new_state:
+                chat.state = new_state
+            chat.updated_at = datetime.datetime.now(datetime.UTC)
+            db.session.commit()
+            pregenerate_message_audio(ai_message_obj.id, ai_message)
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error saving streamed message: {str(e)}", exc_info=True)
+            yield sse_event({"error": str(e)}, event="error")
+            return
+
+        if speaker:
+            for segment in speaker.finish(timeout=SPEAK_SEGMENT_TIMEOUT):
+                yield audio_event(segment)
+
+        yield sse_event({
+            'ai_message': ai_message,
+            'hidden': False,
+            'raw_message': ai_message,
+            'followup': None,
+            'callback': callback,
+            'is_question': False,
+            'similar_to': similar
+        }, event="done")
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop reverse proxies from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 # --- Health Check Endpoint ---
 @app.route('/api/health', methods=['GET'])
 def health():
@@ -287,6 +554,11 @@ def api_detect_language():
     lang = detect_language(text)
     return jsonify({'lang': lang})
 
+@app.errorhandler(413)
+def request_too_large(e):
+    limit_mb = app.config['MAX_CONTENT_LENGTH'] / (1024 * 1024)
+    return jsonify({'error': f'Request is too large, the limit is {limit_mb:g} MB'}), 413
+
 # --- Utility: Extract Text from File (PDF/Image/Audio) ---
 @app.route('/api/utils/extract', methods=['POST'])
 def api_extract():
@@ -294,46 +566,114 @@ def api_extract():
         app.logger.warning("No file uploaded in request.")
         return jsonify({'error': 'No file uploaded'}), 400
     file = request.files['file']
-    filename = file.filename.lower()
-    app.logger.info(f"Received file: {filename}")
-    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(filename)[-1]) as tmp:
-        file.save(tmp.name)
-        file_size = os.path.getsize(tmp.name)
-        app.logger.info(f"Saved file to temp: {tmp.name} (size: {file_size} bytes)")
+    app.logger.info(f"Received file: {file.filename}")
+    try:
+        upload = receive_upload(file)
+    except UploadRejected as e:
+        app.logger.warning(f"Rejected upload: {e}")
+        return jsonify({'error': str(e)}), e.status_code
+    with upload:
+        text = extract_text_cached(upload.source(), upload.filename, digest=upload.digest)
+    app.logger.info(f"Final extracted text length: {len(text)} chars for file: {upload.filename}")
+    return jsonify({'text': text})
+
+# --- Utility: Extraction Jobs ---
+@app.route('/api/utils/extract/jobs', methods=['POST'])
+def api_extract_job_submit():
+    """Queue extraction of an uploaded file and return its job id right away."""
+    if 'file' not in request.files:
+        app.logger.warning("No file uploaded in request.")
+        return jsonify({'error': 'No file uploaded'}), 400
+    try:
+        upload = receive_upload(request.files['file'])
+    except UploadRejected as e:
+        app.logger.warning(f"Rejected upload: {e}")
+        return jsonify({'error': str(e)}), e.status_code
+    app.logger.info(f"Queued extraction job for file: {upload.filename} (size: {upload.size} bytes)")
+    # The job owns the upload from here and closes it when it finishes
+    job_id = extraction_jobs.submit_job(
+        lambda progress: extract_text_cached(
+            upload.source(), upload.filename, progress=progress, digest=upload.digest
+        ),
+        filename=upload.filename,
+        cleanup=upload.close
+    )
+    return jsonify({'job_id': job_id, 'status': 'queued'}), 202
+
+@app.route('/api/utils/extract/jobs/<job_id>', methods=['GET'])
+def api_extract_job_status(job_id):
+    """
+    Return the status, progress and (once done) the text of an extraction job.
+    Pass ?wait=<seconds> to long-poll until the job changes.
+    """
+    try:
+        wait = min(float(request.args.get('wait', 0)), EXTRACT_JOB_MAX_WAIT)
+    except ValueError:
+        return jsonify({'error': 'wait must be a number of seconds'}), 400
+    job = extraction_jobs.get_job(job_id, wait=max(wait, 0))
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    return jsonify(job)
+
+# --- Utility: Batch Extraction ---
+@app.route('/api/utils/extract/batch', methods=['POST'])
+def api_extract_batch():
+    """
+    Extract text from several uploaded files (form field 'files') at once.
+
+    Files are processed concurrently, at most EXTRACT_BATCH_CONCURRENCY at a
+    time, and each result is streamed back as one NDJSON line as soon as it
+    is ready: {"index": i, "filename": ..., "text": ...}. The last line is
+    {"done": true, "count": n}.
+    """
+    uploads = [f for f in request.files.getlist('files') if f and f.filename]
+    if not uploads:
+        app.logger.warning("No files uploaded in batch request.")
+        return jsonify({'error': 'No files uploaded'}), 400
+    if len(uploads) > EXTRACT_BATCH_MAX_FILES:
+        return jsonify({'error': f'At most {EXTRACT_BATCH_MAX_FILES} files per request'}), 400
+
+    # Read the uploads before streaming, while the request body is still readable
+    saved = []
+    try:
+        for file in uploads:
+            saved.append(receive_upload(file))
+    except UploadRejected as e:
+        for upload in saved:
+            upload.close()
+        app.logger.warning(f"Rejected batch upload: {e}")
+        return jsonify({'error': str(e)}), e.status_code
+    app.logger.info(f"Received batch of {len(saved)} files ({sum(u.size for u in saved)} bytes)")
+
+    def generate():
+        executor = ThreadPoolExecutor(max_workers=EXTRACT_BATCH_CONCURRENCY, thread_name_prefix='extract-batch')
         try:
-            if filename.endswith('.pdf'):
-                text = extract_text_from_pdf(tmp.name)
-                app.logger.info(f"PDF extraction result length: {len(text)} chars")
-                if not text.strip():
-                    app.logger.warning(f"PDF extraction returned empty text for file: {filename}")
-            elif filename.endswith(('.jpg', '.jpeg', '.png')):
-                from utils import process_image
-                try:
-                    text = process_image(tmp.name)
-                    app.logger.info(f"Image OCR result length: {len(text)} chars")
-                    if not text.strip():
-                        app.logger.warning(f"Image OCR returned empty text for file: {filename}")
-                except Exception as e:
-                    app.logger.error(f"Image processing error: {str(e)}")
-                    text = f"Image processing error: {str(e)}"
-            elif filename.endswith(('.wav', '.mp3', '.m4a')):
-                from utils import process_audio
+            futures = {
+                executor.submit(
+                    extract_text_cached, upload.source(), upload.filename, digest=upload.digest
+                ): (index, upload.filename)
+                for index, upload in enumerate(saved)
+            }
+            for future in as_completed(futures):
+                index, filename = futures[future]
                 try:
-                    text = process_audio(tmp.name)
-                    app.logger.info(f"Audio transcription result length: {len(text)} chars")
-                    if not text.strip():
-                        app.logger.warning(f"Audio transcription returned empty text for file: {filename}")
+                    result = {'index': index, 'filename': filename, 'text': future.result()}
                 except Exception as e:
-                    app.logger.error(f"Audio processing error: {str(e)}")
-                    text = f"Audio processing error: {str(e)}"
-            else:
-                app.logger.warning(f"Unsupported file type: {filename}")
-                text = ''
-        except Exception as e:
-            app.logger.error(f"General extraction error for file {filename}: {str(e)}", exc_info=True)
-            text = f"General extraction error: {str(e)}"
-    app.logger.info(f"Final extracted text length: {len(text)} chars for file: {filename}")
-    return jsonify({'text': text})
+                    app.logger.error(f"Batch extraction error for file {filename}: {str(e)}", exc_info=True)
+                    result = {'index': index, 'filename': filename, 'error': str(e)}
+                yield json.dumps(result) + "\n"
+            yield json.dumps({'done': True, 'count': len(saved)}) + "\n"
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            for upload in saved:
+                upload.close()
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/api/utils/extract/cache', methods=['GET'])
+def api_extract_cache_stats():
+    """Hit/miss counts and size of the extraction cache, across all workers."""
+    return jsonify(extraction_cache.cache.stats())
 
 # --- OpenAI Completion Endpoint ---
 @app.route('/api/openai', methods=['POST'])
@@ -341,7 +681,9 @@ def api_openai():
     try:
         data = request.get_json()
         text = data.get('prompt', '')
-        response = get_openai_response(text)
+        response = get_openai_response(text, use_cache=use_completion_cache(data))
+        if response is None:
+            return jsonify({'error': 'OpenAI request failed'}), 502
         # Hide fallback/default responses from user
         fallback_phrases = [
             "I don't know",
@@ -351,11 +693,26 @@ def api_openai():
             "I cannot answer"
         ]
         hide = any(phrase.lower() in response.lower() for phrase in fallback_phrases)
-        return jsonify({'response': '' if hide else response, 'raw_response': response, 'hidden': hide})
+        return jsonify({
+            'response': '' if hide else response,
+            'raw_response': response,
+            'hidden': hide,
+            'similar_to': similar_to(response)
+        })
     except Exception as e:
         print("OpenAI endpoint error:", e)
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/openai/metrics', methods=['GET'])
+def api_openai_metrics():
+    """Latency, slot wait and token usage of this worker's OpenAI calls."""
+    return jsonify(openai_client.metrics())
+
+@app.route('/api/openai/cache', methods=['GET'])
+def api_completion_cache_stats():
+    """Hit counts and size of the completion cache and of the similarity index."""
+    return jsonify({**completion_cache.stats(), 'similarity': similarity_cache.stats()})
+
 # --- Image Generation Endpoint ---
 @app.route('/generate_image', methods=['POST'])
 def generate_image():
@@ -365,57 +722,162 @@ def generate_image():
         if not text:
             return jsonify({'error': 'No prompt provided'}), 400
         # Use OpenAI DALL-E API
-        if not os.getenv("OPENAI_API_KEY"):
-            return jsonify({'error': 'OpenAI API key not set'}), 500
-        import openai
-        openai.api_key = os.getenv("OPENAI_API_KEY")
-        response = openai.Image.create(
-            prompt=text,
-            n=1,
-            size="512x512"
-        )
-        image_url = response['data'][0]['url']
+        image_url = openai_client.generate_image(text, size="512x512")
         return jsonify({'image_url': image_url})
     except Exception as e:
         print("Image generation error:", e)
         return jsonify({'error': str(e)}), 500
 
 # --- TTS Endpoint ---
+def audio_url_for(filename):
+    """Full URL of a file in static/audio."""
+    return f"{request.host_url}api/static/audio/{filename}"
+
+def pregenerate_message_audio(message_id, text):
+    """
+    Start speech synthesis for a saved AI message off the request path and
+    record the file on the message once it is ready.
+    """
+    def save(filename):
+        with app.app_context():
+            message = db.session.get(ChatMessage, message_id)
+            if message is not None:
+                message.audio_file = filename
+                db.session.commit()
+
+    tts_cache.pregenerate(text, on_ready=save)
+
 @app.route('/api/tts', methods=['POST'])
 @jwt_required()
 def tts():
+    """
+    Return the URL of the speech for the given text. Audio is cached by a
+    hash of the text and voice settings, so repeated text is not synthesized
+    again. Optional fields: lang, slow, format ("mp3" or "ogg" for Opus).
+    """
     try:
         data = request.get_json()
         text = data.get('text', '')
         if not text:
             return jsonify({'error': 'No text provided'}), 400
-            
-        # Create static and audio directories if they don't exist
-        static_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
-        audio_dir = os.path.join(static_dir, 'audio')
-        os.makedirs(audio_dir, exist_ok=True)
-        
-        # Generate unique filename
-        filename = f"tts_{uuid.uuid4().hex}.mp3"
-        filepath = os.path.join(audio_dir, filename)
-        
-        # Generate TTS audio
-        tts = gTTS(text=text, lang='en', slow=False)
-        tts.save(filepath)
-        
-        # Return the full URL for the audio file
-        audio_url = f"{request.host_url}api/static/audio/{filename}"
-        return jsonify({'audio_url': audio_url})
-        
+
+        filename, cached = tts_cache.get_speech(
+            text, lang=data.get('lang'), slow=data.get('slow', False), fmt=data.get('format', 'mp3')
+        )
+        return jsonify({'audio_url': audio_url_for(filename), 'cached': cached})
+
     except Exception as e:
         logging.error(f"TTS error: {str(e)}", exc_info=True)
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/tts/stream', methods=['POST'])
+@jwt_required()
+def tts_stream():
+    """
+    Stream the speech for the given text with chunked transfer, sentence by
+    sentence as it is synthesized, so playback can start before the whole
+    text is voiced. Takes the same fields as /api/tts. X-Audio-Url names the
+    cached file, which can be fetched (with Range requests) once the stream
+    has finished.
+    """
+    data = request.get_json() or {}
+    text = data.get('text', '')
+    if not text:
+        return jsonify({'error': 'No text provided'}), 400
+    filename, mimetype, chunks = tts_cache.stream_speech(
+        text, lang=data.get('lang'), slow=data.get('slow', False), fmt=data.get('format', 'mp3')
+    )
+
+    def generate():
+        try:
+            yield from chunks
+        except Exception as e:
+            # Headers are already sent, so the client sees a truncated stream
+            logging.error(f"TTS stream error: {str(e)}", exc_info=True)
+
+    response = Response(stream_with_context(generate()), mimetype=mimetype)
+    response.headers['X-Audio-Url'] = audio_url_for(filename)
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/tts/cache', methods=['GET'])
+def api_tts_cache_stats():
+    """Hit/miss counts of this worker and the size of the TTS audio cache."""
+    return jsonify(tts_cache.stats())
+
+@app.route('/api/infermedica/metrics', methods=['GET'])
+def api_infermedica_metrics():
+    """Per-endpoint call counts, retries and latency of this worker's Infermedica calls."""
+    return jsonify(infermedica_client.metrics())
+
+@app.route('/api/infermedica/cache', methods=['GET'])
+def api_infermedica_cache_stats():
+    """Hit counts and size of the Infermedica /parse and /diagnosis result cache."""
+    return jsonify(infermedica_client.cache_stats())
+
+# --- Local Symptom Index ---
+@app.route('/api/symptoms/suggest', methods=['GET'])
+def api_symptoms_suggest():
+    """Symptom names starting with ?q=, from the local catalog, for autocomplete."""
+    prefix = request.args.get('q', '')
+    limit = min(request.args.get('limit', 8, type=int), 25)
+    return jsonify({"suggestions": symptom_index.suggest(prefix, limit=limit, sex=request.args.get('sex'))})
+
+@app.route('/api/symptoms/match', methods=['POST'])
+def api_symptoms_match():
+    """
+    Resolve symptom phrases to Infermedica ids from the local catalog.
+    Takes {"text"} (split on commas, "and", "or") or {"phrases"}; phrases
+    listed as unresolved need a remote /search.
+    """
+    data = request.get_json() or {}
+    phrases = data.get('phrases')
+    if phrases is None:
+        phrases = symptom_index.split_phrases(data.get('text', ''))
+    if not isinstance(phrases, list) or not all(isinstance(p, str) for p in phrases):
+        return jsonify({"msg": "phrases must be a list of strings"}), 400
+    matches, unresolved = symptom_index.resolve_phrases(phrases, sex=data.get('sex'))
+    return jsonify({"matches": matches, "unresolved": unresolved})
+
+@app.route('/api/symptoms/stats', methods=['GET'])
+def api_symptoms_stats():
+    """Catalog size and age, and how many lookups this worker answered locally."""
+    return jsonify(symptom_index.stats())
+
 # Serve static files
 @app.route('/api/static/<path:filename>')
 def serve_static(filename):
     static_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
-    return send_from_directory(static_dir, filename)
+    # conditional=True answers Range requests with 206 partial content, so
+    # audio players can start playback and seek before the whole file arrives
+    response = send_from_directory(static_dir, filename, conditional=True)
+    if filename.startswith('audio/'):
+        # Audio file names are content hashes, so a URL always serves the same bytes
+        response.headers['Cache-Control'] = f'public, max-age={TTS_AUDIO_MAX_AGE}, immutable'
+    return response
+
+# --- CLI: Boot Import Report ---
+@app.cli.command('import-report')
+@click.option('--top', default=15, show_default=True, help='Number of packages to list.')
+@click.option('--check', is_flag=True, help='Exit with status 1 when the boot budget is exceeded.')
+def import_report(top, check):
+    """Import app.py in a fresh interpreter and print per-module import cost."""
+    import boot_report
+    result = boot_report.measure_boot('app')
+    click.echo(boot_report.format_report(result, top=top))
+    if check and not boot_report.within_budget(result):
+        raise SystemExit(1)
+
+# --- CLI: Symptom Catalog ---
+@app.cli.command('sync-symptoms')
+@click.option('--age', default=30, show_default=True, help='Patient age the catalog is requested for.')
+def sync_symptoms(age):
+    """Download the Infermedica symptom catalog used for local matching."""
+    try:
+        count = symptom_index.sync_catalog(age=age)
+    except infermedica_client.InfermedicaError as e:
+        raise click.ClickException(f"Could not download the symptom catalog: {e}")
+    click.echo(f"Stored {count} symptoms in {symptom_index.SYMPTOM_CATALOG_PATH}")
 
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
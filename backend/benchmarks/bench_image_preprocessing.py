@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark the NumPy OCR preprocessing pipeline against the previous path
+(grayscale + fixed threshold at full resolution).
+
+Generates synthetic phone-sized JPEGs, a prescription and a skin photo, and
+reports time per image and throughput for each path. With --ocr the
+preprocessed images are also run through Tesseract, which needs the
+tesseract executable.
+
+Usage:
+    cd backend
+    python benchmarks/bench_image_preprocessing.py --runs 5 --ocr
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageFont, ImageOps
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image_preprocessing import preprocess_for_ocr  # noqa: E402
+
+PHOTO_SIZE = (4032, 3024)  # 12 megapixels
+
+
+def make_prescription():
+    img = Image.new("RGB", PHOTO_SIZE, (232, 228, 220))
+    draw = ImageDraw.Draw(img)
+    font = ImageFont.load_default(size=64)
+    lines = [
+        "Rx: Amoxicillin 500mg capsules",
+        "Take one capsule three times daily for 7 days",
+        "Paracetamol 1g every 6 hours as needed for fever",
+        "Review in one week if symptoms persist",
+    ]
+    for i in range(24):
+        draw.text((250, 200 + i * 110), lines[i % len(lines)], fill=(40, 40, 60), font=font)
+    img = img.rotate(2, fillcolor=(232, 228, 220)).filter(ImageFilter.GaussianBlur(1))
+    return to_jpeg(img)
+
+
+def make_skin_photo():
+    rng = np.random.default_rng(0)
+    arr = np.empty((PHOTO_SIZE[1], PHOTO_SIZE[0], 3), dtype=np.uint8)
+    arr[:] = (214, 168, 146)
+    yy, xx = np.ogrid[:PHOTO_SIZE[1], :PHOTO_SIZE[0]]
+    for _ in range(20):
+        cy, cx, r = rng.integers(0, PHOTO_SIZE[1]), rng.integers(0, PHOTO_SIZE[0]), rng.integers(40, 220)
+        arr[(yy - cy) ** 2 + (xx - cx) ** 2 < r ** 2] = (176, 70, 64)
+    img = Image.fromarray(arr).filter(ImageFilter.GaussianBlur(4))
+    return to_jpeg(img)
+
+
+def to_jpeg(img):
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+def legacy_preprocess(data):
+    img = Image.open(io.BytesIO(data))
+    img = ImageOps.grayscale(img)
+    threshold = int(os.getenv("OCR_THRESHOLD", "140"))
+    return img.point(lambda x: 0 if x < threshold else 255, '1'), True
+
+
+def numpy_preprocess(data):
+    return preprocess_for_ocr(Image.open(io.BytesIO(data)))
+
+
+def bench(name, func, data, runs, ocr):
+    if ocr:
+        import pytesseract
+    timings = []
+    ocr_timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        img, has_text = func(data)
+        timings.append(time.perf_counter() - start)
+        if ocr and has_text:
+            start = time.perf_counter()
+            pytesseract.image_to_string(img)
+            ocr_timings.append(time.perf_counter() - start)
+    per_image = sum(timings) / runs
+    line = f"  {name:<10} {per_image * 1000:8.1f} ms/image  {1 / per_image:6.2f} images/s  output {img.size[0]}x{img.size[1]}  text={has_text}"
+    if ocr_timings:
+        line += f"  ocr {sum(ocr_timings) / len(ocr_timings) * 1000:8.1f} ms"
+    elif ocr:
+        line += "  ocr skipped"
+    print(line)
+    return per_image + (sum(ocr_timings) / len(ocr_timings) if ocr_timings else 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--ocr", action="store_true", help="also time Tesseract on the output")
+    args = parser.parse_args()
+
+    for label, data in (("prescription", make_prescription()), ("skin photo", make_skin_photo())):
+        print(f"{label} ({PHOTO_SIZE[0]}x{PHOTO_SIZE[1]} JPEG, {len(data) // 1024} KB)")
+        legacy = bench("legacy", legacy_preprocess, data, args.runs, args.ocr)
+        numpy_time = bench("numpy", numpy_preprocess, data, args.runs, args.ocr)
+        print(f"  speedup    {legacy / numpy_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
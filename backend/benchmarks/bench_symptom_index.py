@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark the local symptom index.
+
+Builds the index from the synced catalog (`flask sync-symptoms`) and reports
+the build time and the latency of resolve() and suggest() per call. With a
+database it then replays the user messages in the chat_message table and
+counts the upstream calls the index avoids: a message whose every phrase
+resolves locally skips /parse, and every resolved wizard phrase skips one
+/search. Without a database it replays a short built-in list of phrases.
+
+Usage:
+    cd backend
+    python benchmarks/bench_symptom_index.py
+    DATABASE_URL=postgresql://... python benchmarks/bench_symptom_index.py --sample 5000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import symptom_index  # noqa: E402
+
+MESSAGES_SQL = text("SELECT content FROM chat_message WHERE sender = 'user' AND content IS NOT NULL")
+
+SAMPLE_MESSAGES = [
+    "headache", "fever", "headache and fever", "sore throat, cough", "I have a headache",
+    "chest pain", "stomach pain and nausea", "dizziness", "back pain", "runny nose and sneezing",
+    "I have had a terrible headache for three days", "no fever but a bad cough",
+    "my child has a rash on the arms", "fatigue", "shortness of breath", "vomiting or diarrhea",
+]
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(int(share * len(values)), len(values) - 1)]
+
+
+def time_calls(call, inputs, repeat):
+    """Per-call latencies in microseconds."""
+    latencies = []
+    for _ in range(repeat):
+        for value in inputs:
+            start = time.perf_counter()
+            call(value)
+            latencies.append((time.perf_counter() - start) * 1e6)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--catalog", default=symptom_index.SYMPTOM_CATALOG_PATH)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--sample", type=int, default=5000, help="messages to replay (0 for all)")
+    parser.add_argument("--repeat", type=int, default=20, help="timing passes over the inputs")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index, info = symptom_index.load_index(args.catalog)
+    build_ms = (time.perf_counter() - start) * 1000
+    if not len(index):
+        parser.error(f"no symptom catalog at {args.catalog}; run `flask sync-symptoms` first")
+    print(f"{len(index)} symptoms, {len(index.entries)} names, index built in {build_ms:.0f} ms\n")
+
+    messages = SAMPLE_MESSAGES
+    if args.database_url:
+        with create_engine(args.database_url).connect() as conn:
+            messages = [row[0] for row in conn.execute(MESSAGES_SQL) if row[0].strip()]
+        if args.sample and len(messages) > args.sample:
+            messages = random.Random(args.seed).sample(messages, args.sample)
+    phrases = [phrase for message in messages for phrase in symptom_index.split_phrases(message)]
+    prefixes = sorted({phrase[:length] for phrase in phrases for length in (1, 3, 5)})
+    print(f"{len(messages)} messages, {len(phrases)} phrases\n")
+
+    print(f"{'call':<10}  {'p50 us':>8}  {'p95 us':>8}  {'p99 us':>8}  {'max us':>8}")
+    for name, call, inputs in (
+        ("resolve", index.resolve, phrases),
+        ("suggest", index.suggest, prefixes),
+    ):
+        latencies = time_calls(call, inputs, args.repeat)
+        print(
+            f"{name:<10}  {percentile(latencies, 0.5):8.1f}  {percentile(latencies, 0.95):8.1f}  "
+            f"{percentile(latencies, 0.99):8.1f}  {max(latencies):8.1f}"
+        )
+
+    resolved = [phrase for phrase in phrases if index.resolve(phrase)]
+    local_messages = [
+        message for message in messages
+        if (parts := symptom_index.split_phrases(message))
+        and len(parts) <= symptom_index.MAX_LOCAL_PHRASES
+        and all(index.resolve(part) for part in parts)
+    ]
+    print(f"\n/parse calls avoided:  {len(local_messages)} of {len(messages)} ({len(local_messages) / len(messages):.1%})")
+    print(f"/search calls avoided: {len(resolved)} of {len(phrases)} ({len(resolved) / len(phrases):.1%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark the TTS engines (gTTS and local espeak-ng) on typical chat replies.
+
+For each engine, reports the latency of a short, a medium and a long reply,
+synthesized whole and as parallel sentence chunks, and the throughput of
+--concurrency replies synthesized at once. The cache is bypassed, so every
+run is a real synthesis. gTTS needs network access; espeak needs espeak-ng
+and ffmpeg. Engines that are not available are skipped.
+
+Usage:
+    cd backend
+    python benchmarks/bench_tts_engines.py --runs 3 --concurrency 4
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tts  # noqa: E402
+
+TEXTS = {
+    "short": "Please consult a doctor if the pain gets worse.",
+    "medium": (
+        "Based on your symptoms, the most likely cause is a viral upper respiratory infection. "
+        "Rest, drink plenty of fluids and take paracetamol for fever. "
+        "See a doctor if the fever lasts more than three days."
+    ),
+    "long": (
+        "Based on the symptoms you described, headache, fever and a stiff neck, there are a few possible causes. "
+        "The most common is a viral infection such as the flu, which usually resolves on its own within a week. "
+        "However, a stiff neck together with fever can also be a sign of meningitis, which needs urgent care. "
+        "If you notice a rash that does not fade under pressure, confusion, or sensitivity to light, go to an emergency department right away. "
+        "In the meantime, rest, stay hydrated and take paracetamol or ibuprofen for the fever and pain. "
+        "Avoid driving if you feel drowsy, and ask someone to stay with you. "
+        "If the symptoms improve over the next two days, a visit to your general practitioner is enough."
+    ),
+}
+
+
+def synthesize(text, settings, chunked):
+    if chunked:
+        return b"".join(tts._mp3_pieces(text, settings))
+    return tts._synthesize(text, settings)
+
+
+def time_call(func, *args):
+    start = time.perf_counter()
+    data = func(*args)
+    return time.perf_counter() - start, len(data)
+
+
+def bench_latency(engine, runs):
+    settings = tts.voice_settings(engine=engine)
+    for label, text in TEXTS.items():
+        for chunked in (False, True):
+            timings = []
+            for _ in range(runs):
+                # Chunks are cached on disk, so start every run without them
+                with tempfile.TemporaryDirectory(prefix="bench_tts_") as audio_dir:
+                    tts.TTS_AUDIO_DIR = audio_dir
+                    elapsed, size = time_call(synthesize, text, settings, chunked)
+                timings.append(elapsed)
+            mode = "chunked" if chunked else "whole"
+            print(
+                f"  {label:<7} {mode:<8} {len(text):5d} chars  "
+                f"median {statistics.median(timings) * 1000:8.1f} ms  "
+                f"min {min(timings) * 1000:8.1f} ms  {size // 1024:4d} KB"
+            )
+
+
+def bench_throughput(engine, concurrency, runs):
+    settings = tts.voice_settings(engine=engine)
+    text = TEXTS["medium"]
+    total = concurrency * runs
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        start = time.perf_counter()
+        list(pool.map(lambda _: tts._synthesize(text, settings), range(total)))
+        elapsed = time.perf_counter() - start
+    print(
+        f"  throughput  {total} medium replies, {concurrency} at a time: "
+        f"{total / elapsed:6.2f} replies/s, {total * len(text) / elapsed:8.0f} chars/s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--engines", default=",".join(tts.ENGINES), help="comma-separated engine names")
+    args = parser.parse_args()
+
+    for engine in args.engines.split(","):
+        if not tts.engine_available(engine):
+            print(f"{engine}: not available, skipped")
+            continue
+        print(f"{engine}")
+        try:
+            bench_latency(engine, args.runs)
+            bench_throughput(engine, args.concurrency, args.runs)
+        except Exception as e:
+            print(f"  failed: {e}")
+
+
+if __name__ == "__main__":
+    main()
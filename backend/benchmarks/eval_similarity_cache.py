@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Evaluate the similarity cache on stored chat messages.
+
+Pairs each user message in the chat_message table with the AI reply that
+followed it, indexes a random half of the pairs and looks up the questions
+of the other half, as if they were asked later. For each threshold it
+reports the hit rate (share of lookups that would be answered from the
+cache) and the false-match rate (share of hits whose reused answer does not
+agree with the answer the question really got). Agreement is the cosine
+similarity of the two answers' term vectors, a proxy for "says the same
+thing"; the worst hits are printed for a manual check. Questions that are
+identical after normalization are left out, since the exact completion
+cache answers those.
+
+Usage:
+    cd backend
+    DATABASE_URL=postgresql://... python benchmarks/eval_similarity_cache.py --sample 2000
+"""
+import argparse
+import os
+import random
+import sys
+
+import numpy as np
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import similarity_cache  # noqa: E402
+from completion_cache import normalize_text  # noqa: E402
+
+PAIRS_SQL = text(
+    "SELECT chat_id, sender, content FROM chat_message "
+    "WHERE content IS NOT NULL ORDER BY chat_id, created_at, id"
+)
+
+
+def load_pairs(database_url):
+    """(question, answer) for every user message directly followed by an AI reply."""
+    engine = create_engine(database_url)
+    with engine.connect() as conn:
+        rows = conn.execute(PAIRS_SQL).fetchall()
+    pairs = []
+    for (chat_id, sender, content), (next_chat_id, next_sender, next_content) in zip(rows, rows[1:]):
+        if chat_id == next_chat_id and sender == "user" and next_sender == "ai" and content.strip():
+            pairs.append((content, next_content))
+    return pairs
+
+
+def answer_agreement(a, b):
+    va, vb = similarity_cache.term_vector(a), similarity_cache.term_vector(b)
+    norm = np.linalg.norm(va) * np.linalg.norm(vb)
+    return float(va @ vb / norm) if norm else 0.0
+
+
+def evaluate(pairs, seed):
+    """Best match, its score and the answer agreement for each held-out question."""
+    random.Random(seed).shuffle(pairs)
+    half = len(pairs) // 2
+    indexed, queries = pairs[:half], pairs[half:]
+    index = similarity_cache.SimilarityIndex(max_entries=max(len(indexed), 1), ttl=0)
+    for question, answer in indexed:
+        index.add(question, answer)
+    seen = {normalize_text(question) for question, _ in indexed}
+
+    results = []
+    for question, answer in queries:
+        if normalize_text(question) in seen:
+            continue
+        seen.add(normalize_text(question))
+        match = index.search(question, threshold=-1.0)
+        if match is None:
+            results.append((question, None, 0.0, 0.0))
+            continue
+        results.append((question, match, match.similarity, answer_agreement(answer, str(match))))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--sample", type=int, default=2000, help="pairs to use (0 for all)")
+    parser.add_argument("--thresholds", default="0.7,0.8,0.85,0.9,0.95")
+    parser.add_argument("--agreement", type=float, default=0.5,
+                        help="answer similarity below which a hit counts as a false match")
+    parser.add_argument("--show", type=int, default=5, help="worst hits to print at SIMILARITY_THRESHOLD")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("set DATABASE_URL or pass --database-url")
+
+    pairs = load_pairs(args.database_url)
+    if args.sample and len(pairs) > args.sample:
+        pairs = random.Random(args.seed).sample(pairs, args.sample)
+    results = evaluate(pairs, args.seed)
+    if not results:
+        print(f"{len(pairs)} question/answer pairs, but no held-out question that is not already indexed")
+        return
+    print(f"{len(pairs)} pairs, {len(pairs) // 2} indexed, {len(results)} distinct questions looked up\n")
+
+    print(f"{'threshold':>9}  {'hit rate':>8}  {'hits':>5}  {'false matches':>13}  {'false-match rate':>16}")
+    for threshold in (float(t) for t in args.thresholds.split(",")):
+        hits = [r for r in results if r[1] is not None and r[2] >= threshold]
+        false = [r for r in hits if r[3] < args.agreement]
+        print(
+            f"{threshold:9.2f}  {len(hits) / len(results):8.1%}  {len(hits):5d}  {len(false):13d}  "
+            f"{(len(false) / len(hits) if hits else 0.0):16.1%}"
+        )
+
+    hits = sorted(
+        (r for r in results if r[1] is not None and r[2] >= similarity_cache.SIMILARITY_THRESHOLD),
+        key=lambda r: r[3]
+    )
+    if hits and args.show:
+        print(f"\nLeast agreeing hits at threshold {similarity_cache.SIMILARITY_THRESHOLD}:")
+        for question, match, score, agreement in hits[:args.show]:
+            print(f"  {score:.3f} sim, {agreement:.2f} agreement: {question!r} ~ {match.question!r}")
+
+
+if __name__ == "__main__":
+    main()
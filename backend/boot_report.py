@@ -0,0 +1,137 @@
+import os
+import sys
+import json
+import time
+import subprocess
+from collections import defaultdict
+
+# Boot budget for one backend worker: time to import app.py and the peak RSS
+# of the process afterwards. `flask import-report` measures both in a fresh
+# interpreter and compares them with these limits.
+BOOT_IMPORT_BUDGET_MS = float(os.getenv("BOOT_IMPORT_BUDGET_MS", "1500"))
+BOOT_RSS_BUDGET_MB = float(os.getenv("BOOT_RSS_BUDGET_MB", "150"))
+
+# Modules that must only be loaded on first use, never at boot
+LAZY_MODULES = (
+    "torch",
+    "transformers",
+    "speech_recognition",
+    "pytesseract",
+    "PyPDF2",
+    "pdf2image",
+    "langdetect",
+    "deep_translator",
+    "gtts",
+    "numpy",
+)
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_CHILD_SCRIPT = """
+import json, resource, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{
+    "import_seconds": seconds,
+    "max_rss_bytes": max_rss if sys.platform == "darwin" else max_rss * 1024,
+    "lazy_loaded": sorted(m for m in {lazy_modules!r} if m in sys.modules),
+}}))
+"""
+
+
+def parse_importtime(stderr):
+    """
+    Parse the output of `python -X importtime`.
+
+    Returns:
+        list: (module, self_us, cumulative_us, depth) in import order
+    """
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        except ValueError:
+            continue
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        modules.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return modules
+
+
+def measure_boot(module="app"):
+    """
+    Import module in a fresh interpreter and measure what that costs.
+
+    Returns:
+        dict: wall_seconds (interpreter start included), import_seconds,
+        max_rss_bytes, lazy_loaded (LAZY_MODULES that were imported anyway)
+        and modules, the parsed importtime entries
+    """
+    script = _CHILD_SCRIPT.format(module=module, lazy_modules=LAZY_MODULES)
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", script],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+    )
+    wall_seconds = time.perf_counter() - start
+    if proc.returncode != 0:
+        errors = [line for line in proc.stderr.splitlines() if not line.startswith("import time:")]
+        raise RuntimeError(f"Importing {module} failed:\n" + "\n".join(errors[-20:]))
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["wall_seconds"] = wall_seconds
+    result["modules"] = parse_importtime(proc.stderr)
+    return result
+
+
+def package_totals(modules):
+    """Sum the self time of every module by top-level package, most expensive first."""
+    totals = defaultdict(int)
+    for name, self_us, _, _ in modules:
+        totals[name.split(".")[0]] += self_us
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def format_report(result, top=15):
+    """Render a measure_boot result as text, ending with the budget check."""
+    import_ms = result["import_seconds"] * 1000
+    rss_mb = result["max_rss_bytes"] / (1024 * 1024)
+    lines = [
+        f"Boot: import app {import_ms:.0f} ms, process wall time {result['wall_seconds'] * 1000:.0f} ms, "
+        f"peak RSS {rss_mb:.1f} MB, {len(result['modules'])} modules",
+        "",
+        f"Top {top} packages by import time:",
+    ]
+    for package, self_us in package_totals(result["modules"])[:top]:
+        lines.append(f"  {self_us / 1000:9.1f} ms  {package}")
+
+    first_party = [
+        m for m in result["modules"]
+        if os.path.exists(os.path.join(BACKEND_DIR, m[0] + ".py"))
+    ]
+    lines += ["", "Backend modules (cumulative, includes their imports):"]
+    for name, _, cumulative_us, _ in sorted(first_party, key=lambda m: m[2], reverse=True):
+        lines.append(f"  {cumulative_us / 1000:9.1f} ms  {name}")
+
+    lines.append("")
+    if result["lazy_loaded"]:
+        lines.append("Loaded at boot but should be lazy: " + ", ".join(result["lazy_loaded"]))
+    time_ok = import_ms <= BOOT_IMPORT_BUDGET_MS
+    rss_ok = rss_mb <= BOOT_RSS_BUDGET_MB
+    lines.append(
+        f"Budget: import {import_ms:.0f}/{BOOT_IMPORT_BUDGET_MS:.0f} ms {'ok' if time_ok else 'OVER'}, "
+        f"RSS {rss_mb:.1f}/{BOOT_RSS_BUDGET_MB:.0f} MB {'ok' if rss_ok else 'OVER'}"
+    )
+    return "\n".join(lines)
+
+
+def within_budget(result):
+    return (
+        result["import_seconds"] * 1000 <= BOOT_IMPORT_BUDGET_MS
+        and result["max_rss_bytes"] / (1024 * 1024) <= BOOT_RSS_BUDGET_MB
+        and not result["lazy_loaded"]
+    )
@@ -0,0 +1,64 @@
+import threading
+from collections import defaultdict, deque
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class CallMetrics:
+    """
+    Latency and counters of outgoing API calls, grouped by name (an endpoint
+    or operation), for this process.
+
+    Only the last `window` latencies of each name are kept for the
+    percentiles; counts and totals cover every call.
+    """
+
+    def __init__(self, window=512):
+        self.window = window
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def record(self, name, seconds, error=False, **counts):
+        """Record one call. Extra keyword counts (e.g. retries=1) are summed per name."""
+        ms = seconds * 1000
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                entry = self._entries[name] = {
+                    "calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0,
+                    "latencies": deque(maxlen=self.window), "counts": defaultdict(int),
+                }
+            entry["calls"] += 1
+            entry["errors"] += bool(error)
+            entry["total_ms"] += ms
+            entry["max_ms"] = max(entry["max_ms"], ms)
+            entry["latencies"].append(ms)
+            for key, value in counts.items():
+                entry["counts"][key] += value or 0
+
+    def snapshot(self):
+        """{name: {calls, errors, mean_ms, p50_ms, p95_ms, max_ms, <counts>}}"""
+        with self._lock:
+            entries = {
+                name: (dict(entry), list(entry["latencies"]), dict(entry["counts"]))
+                for name, entry in self._entries.items()
+            }
+        report = {}
+        for name, (entry, latencies, counts) in entries.items():
+            report[name] = {
+                "calls": entry["calls"],
+                "errors": entry["errors"],
+                "mean_ms": round(entry["total_ms"] / entry["calls"], 1),
+                "p50_ms": round(_percentile(latencies, 0.5), 1),
+                "p95_ms": round(_percentile(latencies, 0.95), 1),
+                "max_ms": round(entry["max_ms"], 1),
+                **counts,
+            }
+        return report
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,78 @@
+import os
+import re
+import json
+import hashlib
+import logging
+import unicodedata
+
+from disk_cache import DiskCache
+from memory_cache import TieredCache
+
+# Cache of OpenAI completions, so a question asked again with the same
+# prompt and settings is answered without another round trip. Each worker
+# keeps the COMPLETION_CACHE_ENTRIES most recently used answers in memory;
+# with COMPLETION_CACHE_PATH set (the default), answers are also stored in a
+# SQLite file shared by all workers on the host. Set it to an empty string
+# to keep the cache in memory only. Entries expire after COMPLETION_CACHE_TTL
+# seconds in both tiers.
+COMPLETION_CACHE_ENABLED = os.getenv("COMPLETION_CACHE_ENABLED", "true").lower() == "true"
+COMPLETION_CACHE_TTL = int(os.getenv("COMPLETION_CACHE_TTL", str(24 * 3600)))
+COMPLETION_CACHE_ENTRIES = int(os.getenv("COMPLETION_CACHE_ENTRIES", "1024"))
+COMPLETION_CACHE_PATH = os.getenv(
+    "COMPLETION_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "completions.sqlite3")
+)
+COMPLETION_CACHE_MAX_BYTES = int(os.getenv("COMPLETION_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+# Bump when a change makes earlier cached answers unsuitable
+COMPLETION_CACHE_VERSION = "1"
+
+WHITESPACE = re.compile(r"\s+")
+
+logger = logging.getLogger(__name__)
+
+cache = TieredCache(
+    COMPLETION_CACHE_ENTRIES,
+    ttl=COMPLETION_CACHE_TTL,
+    disk=DiskCache(COMPLETION_CACHE_PATH, COMPLETION_CACHE_MAX_BYTES, name="completion") if COMPLETION_CACHE_PATH else None,
+)
+
+
+def normalize_text(text):
+    """
+    Fold the differences that do not change what is asked: Unicode form,
+    case, runs of whitespace and trailing punctuation.
+    """
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return WHITESPACE.sub(" ", text).strip().rstrip("?!. ")
+
+
+def cache_key(model, system_prompt, text, temperature, max_tokens):
+    """Digest of everything that determines a completion."""
+    payload = json.dumps(
+        [COMPLETION_CACHE_VERSION, model, system_prompt, normalize_text(text), temperature, max_tokens]
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def lookup(key):
+    """The cached completion for key, or None."""
+    if not COMPLETION_CACHE_ENABLED:
+        return None
+    completion = cache.get(key)
+    if completion is not None:
+        logger.info(f"Completion cache hit {key[:12]}")
+    return completion
+
+
+def store(key, completion):
+    if COMPLETION_CACHE_ENABLED and completion:
+        cache.set(key, completion)
+
+
+def count_bypass():
+    cache.count_bypass()
+
+
+def stats():
+    return {"enabled": COMPLETION_CACHE_ENABLED, **cache.stats()}
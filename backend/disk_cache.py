@@ -0,0 +1,182 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Reads only run a SELECT. Their access times and hit/miss counts are kept in
+# memory and written in one transaction every ACCESS_FLUSH_SECONDS (or after
+# ACCESS_FLUSH_READS reads), with each set(), and before stats(), so readers
+# do not queue for SQLite's write lock
+ACCESS_FLUSH_SECONDS = 5.0
+ACCESS_FLUSH_READS = 200
+
+
+class DiskCache:
+    """
+    Size-capped key/value cache stored in a SQLite file.
+
+    Because the data lives on disk it survives restarts and is shared by all
+    gunicorn workers on the host. Values are stored as JSON. Once the stored
+    values exceed max_bytes, the least recently used entries are evicted.
+    Entries may also carry a TTL. Hit and miss counters are kept in the same
+    file, so stats() covers every worker. Access times and counters of reads
+    reach the file in batches, so LRU order and stats lag by a few seconds.
+    """
+
+    def __init__(self, path, max_bytes, name="cache"):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.name = name
+        self._pending_lock = threading.Lock()
+        self._pending_access = {}
+        self._pending_counts = {"hits": 0, "misses": 0}
+        self._pending_reads = 0
+        self._flushed_at = time.monotonic()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL, expires_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        # A connection per call keeps the cache safe to use from any thread
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _note_read(self, key, now):
+        """Record a read for the next flush; returns True when one is due."""
+        with self._pending_lock:
+            if key is None:
+                self._pending_counts["misses"] += 1
+            else:
+                self._pending_access[key] = now
+                self._pending_counts["hits"] += 1
+            self._pending_reads += 1
+            return (
+                self._pending_reads >= ACCESS_FLUSH_READS
+                or time.monotonic() - self._flushed_at >= ACCESS_FLUSH_SECONDS
+            )
+
+    def _flush_reads(self, conn):
+        """Write the pending access times and counters in conn's transaction."""
+        with self._pending_lock:
+            access, counts = self._pending_access, self._pending_counts
+            self._pending_access = {}
+            self._pending_counts = {"hits": 0, "misses": 0}
+            self._pending_reads = 0
+            self._flushed_at = time.monotonic()
+        conn.executemany(
+            "UPDATE entries SET accessed_at = MAX(accessed_at, ?) WHERE key = ?",
+            [(accessed_at, key) for key, accessed_at in access.items()]
+        )
+        conn.executemany(
+            "INSERT INTO counters (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            [(name, value) for name, value in counts.items() if value]
+        )
+
+    def lookup(self, key):
+        """
+        Return (value, expires_at) for key, or None on a miss. expires_at is
+        a time.time() timestamp, or None for entries without a TTL.
+        """
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT value, expires_at FROM entries WHERE key = ?", (key,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"{self.name} cache read failed: {e}")
+            return None
+        # Expired rows are left for the eviction in the next set()
+        hit = row is not None and (row[1] is None or row[1] >= now)
+        if self._note_read(key if hit else None, now):
+            try:
+                with self._connect() as conn:
+                    self._flush_reads(conn)
+            except sqlite3.Error as e:
+                logger.warning(f"{self.name} cache access update failed: {e}")
+        if not hit:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default on a miss."""
+        found = self.lookup(key)
+        return default if found is None else found[0]
+
+    def set(self, key, value, ttl=None):
+        """Store value under key, evicting least recently used entries if needed."""
+        data = json.dumps(value)
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, size, created_at, accessed_at, expires_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, data, len(data.encode("utf-8")), now, now, expires_at)
+                )
+                self._flush_reads(conn)
+                self._evict(conn)
+        except sqlite3.Error as e:
+            logger.warning(f"{self.name} cache write failed: {e}")
+
+    def _evict(self, conn):
+        conn.execute("DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at < ?", (time.time(),))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        freed = 0
+        evicted = []
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY accessed_at"):
+            if total - freed <= self.max_bytes:
+                break
+            evicted.append((key,))
+            freed += size
+        conn.executemany("DELETE FROM entries WHERE key = ?", evicted)
+        logger.info(f"{self.name} cache evicted {len(evicted)} entries ({freed} bytes)")
+
+    def clear(self):
+        with self._pending_lock:
+            self._pending_access = {}
+            self._pending_counts = {"hits": 0, "misses": 0}
+            self._pending_reads = 0
+        with self._connect() as conn:
+            conn.execute("DELETE FROM entries")
+            conn.execute("DELETE FROM counters")
+
+    def stats(self):
+        """Return hit/miss counts and the current size of the cache."""
+        with self._connect() as conn:
+            self._flush_reads(conn)
+            counters = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        hits = counters.get("hits", 0)
+        misses = counters.get("misses", 0)
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+        }
@@ -0,0 +1,68 @@
+import os
+
+# Infermedica evidence kept in Chat.state["evidence"]. Each symptom appears
+# once: a later answer for the same symptom replaces the earlier one and
+# moves it to the end, and once there are more than EVIDENCE_MAX_ITEMS the
+# least recently mentioned symptoms are dropped. It is stored as one short
+# string per symptom, e.g. {"s_21": "p*", "s_98": "a"}: the first letter is
+# the choice (p = present, a = absent, u = unknown) and "*" marks evidence
+# from the user's own description (Infermedica's "initial" flag).
+EVIDENCE_MAX_ITEMS = int(os.getenv("EVIDENCE_MAX_ITEMS", "64"))
+
+CHOICE_CODES = {"present": "p", "absent": "a", "unknown": "u"}
+CHOICES = {code: choice for choice, code in CHOICE_CODES.items()}
+INITIAL_MARK = "*"
+
+
+def record(evidence, symptom_id, choice_id="present", initial=False, max_items=None):
+    """
+    Add or update one symptom in evidence (a dict of id -> (choice_id, initial)).
+
+    The latest choice_id wins; a symptom once reported as initial stays
+    initial. The oldest entries are dropped beyond max_items.
+    """
+    previous = evidence.pop(symptom_id, None)
+    evidence[symptom_id] = (choice_id, initial or bool(previous and previous[1]))
+    limit = max_items or EVIDENCE_MAX_ITEMS
+    while len(evidence) > limit:
+        del evidence[next(iter(evidence))]
+
+
+def load(state):
+    """
+    The evidence of a chat state as a dict of id -> (choice_id, initial),
+    oldest first. Also reads the list of Infermedica evidence objects older
+    chats stored, deduplicating it on the way.
+    """
+    stored = (state or {}).get("evidence") or {}
+    evidence = {}
+    if isinstance(stored, list):
+        for item in stored:
+            record(evidence, item["id"], item.get("choice_id", "present"), bool(item.get("initial")))
+        return evidence
+    for symptom_id, code in stored.items():
+        evidence[symptom_id] = (CHOICES.get(code[:1], "present"), code.endswith(INITIAL_MARK))
+    return evidence
+
+
+def dump(evidence):
+    """The compact form stored in the chat state."""
+    return {
+        symptom_id: CHOICE_CODES.get(choice_id, "p") + (INITIAL_MARK if initial else "")
+        for symptom_id, (choice_id, initial) in evidence.items()
+    }
+
+
+def save(state, evidence):
+    state["evidence"] = dump(evidence)
+
+
+def to_payload(evidence):
+    """The evidence list for an Infermedica /diagnosis request."""
+    payload = []
+    for symptom_id, (choice_id, initial) in evidence.items():
+        item = {"id": symptom_id, "choice_id": choice_id}
+        if initial:
+            item["initial"] = True
+        payload.append(item)
+    return payload
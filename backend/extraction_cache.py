@@ -0,0 +1,96 @@
+import os
+import hashlib
+import logging
+
+import ocr
+import utils
+from disk_cache import DiskCache
+
+# Bump when a change to the extractors alters their output, so results
+# cached by older code are no longer used
+EXTRACTOR_VERSION = "2"
+
+EXTRACT_CACHE_ENABLED = os.getenv("EXTRACT_CACHE_ENABLED", "true").lower() == "true"
+EXTRACT_CACHE_PATH = os.getenv(
+    "EXTRACT_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "extraction.sqlite3")
+)
+EXTRACT_CACHE_MAX_BYTES = int(os.getenv("EXTRACT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Cached text is re-extracted after this long, so improvements to OCR and
+# the extractors eventually reach files uploaded before them
+EXTRACT_CACHE_TTL = int(os.getenv("EXTRACT_CACHE_TTL", str(30 * 24 * 3600)))
+
+# Results that describe a failure rather than the file, which must not be
+# cached; the extractors return some of these as text instead of raising
+ERROR_PREFIXES = (
+    "Image processing error",
+    "Image OCR error",
+    "Tesseract executable not found",
+    "Audio processing error",
+    "Could not understand audio",
+    "Could not request results",
+    "General extraction error",
+)
+
+logger = logging.getLogger(__name__)
+
+cache = DiskCache(EXTRACT_CACHE_PATH, EXTRACT_CACHE_MAX_BYTES, name="extraction")
+
+
+def file_digest(file_path, chunk_size=1024 * 1024):
+    """SHA-256 of a file's contents, read in chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def extractor_params(filename):
+    """The settings that affect the text extracted from this type of file."""
+    # Imported here so NumPy and Pillow are not loaded at boot
+    import image_preprocessing
+    extension = os.path.splitext(filename)[-1]
+    if extension == ".pdf":
+        return f"pdf:{utils.PDF_MIN_PAGE_CHARS}:{utils.OCR_DPI}:{ocr.OCR_LANG}"
+    if extension in (".jpg", ".jpeg", ".png"):
+        return (
+            f"image:{ocr.OCR_LANG}:{image_preprocessing.OCR_MAX_SIDE}:"
+            f"{image_preprocessing.OCR_THRESHOLD_MODE}:{image_preprocessing.OCR_THRESHOLD}:"
+            f"{image_preprocessing.OCR_DESKEW}:{image_preprocessing.OCR_TEXT_CHECK}"
+        )
+    return f"other:{extension}"
+
+
+def cache_key(digest, filename):
+    return f"{EXTRACTOR_VERSION}:{extractor_params(filename)}:{digest}"
+
+
+def extract_text_cached(source, filename, progress=None, digest=None):
+    """
+    utils.extract_text_from_file with a content-addressed cache in front.
+
+    The key is the SHA-256 of the uploaded bytes plus the extractor version
+    and settings, so a re-upload of the same file returns at once. Pass the
+    digest when it is already known (uploads.receive_upload computes it);
+    otherwise source must be a file path and is hashed here. Empty text and
+    the results of failed or partial extractions (e.g. a PDF page whose OCR
+    failed) are returned but not cached, so the next upload tries again.
+    """
+    if not EXTRACT_CACHE_ENABLED:
+        return utils.extract_text_from_file(source, filename, progress=progress)[0]
+
+    key = cache_key(digest or file_digest(source), filename)
+    text = cache.get(key)
+    if text is not None:
+        logger.info(f"Extraction cache hit for file: {filename}")
+        if progress:
+            progress(1, 1)
+        return text
+
+    text, complete = utils.extract_text_from_file(source, filename, progress=progress)
+    if complete and text.strip() and not text.startswith(ERROR_PREFIXES):
+        cache.set(key, text, ttl=EXTRACT_CACHE_TTL)
+    else:
+        logger.info(f"Not caching incomplete or empty extraction of file: {filename}")
+    return text
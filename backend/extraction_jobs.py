@@ -0,0 +1,127 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Extraction jobs run in a local thread pool inside the backend process, so no
+# external broker is needed. Jobs live in this process only: with several
+# gunicorn workers a client has to poll the worker that accepted the upload,
+# which is why the default Render deployment runs a single worker.
+EXTRACT_JOB_WORKERS = int(os.getenv("EXTRACT_JOB_WORKERS", "2"))
+# Finished jobs are kept this many seconds for clients to collect the result
+EXTRACT_JOB_TTL = int(os.getenv("EXTRACT_JOB_TTL", "900"))
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=EXTRACT_JOB_WORKERS, thread_name_prefix="extract-job")
+_jobs = {}
+_jobs_changed = threading.Condition()
+
+FINISHED_STATUSES = ("done", "failed")
+
+
+def _snapshot(job):
+    return {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "progress": dict(job["progress"]),
+        "result": job["result"],
+        "error": job["error"],
+        "filename": job["filename"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+    }
+
+
+def _update(job_id, **fields):
+    with _jobs_changed:
+        job = _jobs.get(job_id)
+        if job is None:
+            return
+        job.update(fields)
+        job["updated_at"] = time.time()
+        _jobs_changed.notify_all()
+
+
+def _expire_jobs():
+    cutoff = time.time() - EXTRACT_JOB_TTL
+    with _jobs_changed:
+        expired = [
+            job_id for job_id, job in _jobs.items()
+            if job["status"] in FINISHED_STATUSES and job["updated_at"] < cutoff
+        ]
+        for job_id in expired:
+            del _jobs[job_id]
+
+
+def _run(job_id, func, args, cleanup):
+    def progress(done, total):
+        _update(job_id, progress={"done": done, "total": total})
+
+    _update(job_id, status="running")
+    try:
+        result = func(*args, progress=progress)
+        _update(job_id, status="done", result=result)
+    except Exception as e:
+        logger.error(f"Extraction job {job_id} failed: {str(e)}", exc_info=True)
+        _update(job_id, status="failed", error=str(e))
+    finally:
+        if cleanup:
+            try:
+                cleanup()
+            except Exception as e:
+                logger.warning(f"Cleanup for extraction job {job_id} failed: {str(e)}")
+
+
+def submit_job(func, *args, filename=None, cleanup=None):
+    """
+    Queue func(*args, progress=callback) on the extraction worker pool.
+
+    Args:
+        func: Extractor to run; it receives a progress(done, total) callback
+        filename: Name of the uploaded file, reported back to pollers
+        cleanup: Optional callable run once the job has finished, e.g. to
+            remove the temp file holding the upload
+
+    Returns:
+        str: The new job id
+    """
+    _expire_jobs()
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    with _jobs_changed:
+        _jobs[job_id] = {
+            "job_id": job_id,
+            "status": "queued",
+            "progress": {"done": 0, "total": 0},
+            "result": None,
+            "error": None,
+            "filename": filename,
+            "created_at": now,
+            "updated_at": now,
+        }
+    _executor.submit(_run, job_id, func, args, cleanup)
+    return job_id
+
+
+def get_job(job_id, wait=0):
+    """
+    Return a snapshot of a job, or None if it is unknown or expired.
+
+    With wait > 0 this long-polls: it blocks for up to `wait` seconds until
+    the job finishes or reports progress, whichever comes first.
+    """
+    deadline = time.monotonic() + wait
+    with _jobs_changed:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        seen = job["updated_at"]
+        while job["status"] not in FINISHED_STATUSES and job["updated_at"] == seen:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            _jobs_changed.wait(remaining)
+        return _snapshot(job)
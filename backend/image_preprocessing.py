@@ -0,0 +1,170 @@
+import os
+import logging
+
+import numpy as np
+from PIL import Image, ImageOps
+
+# Preprocessing applied to photos and scans before OCR. Everything past the
+# decode step works on NumPy arrays, so no per-pixel Python code runs.
+#
+#   OCR_MAX_SIDE          longest side, in pixels, an image is downscaled to
+#   OCR_THRESHOLD_MODE    otsu (default), adaptive, or fixed (uses OCR_THRESHOLD)
+#   OCR_DESKEW            straighten text tilted by up to OCR_DESKEW_MAX_ANGLE
+#   OCR_TEXT_CHECK        skip OCR on images that do not look like text
+OCR_MAX_SIDE = int(os.getenv("OCR_MAX_SIDE", "2000"))
+OCR_THRESHOLD_MODE = os.getenv("OCR_THRESHOLD_MODE", "otsu").lower()
+OCR_THRESHOLD = int(os.getenv("OCR_THRESHOLD", "140"))
+OCR_DESKEW = os.getenv("OCR_DESKEW", "false").lower() == "true"
+OCR_DESKEW_MAX_ANGLE = float(os.getenv("OCR_DESKEW_MAX_ANGLE", "5"))
+OCR_TEXT_CHECK = os.getenv("OCR_TEXT_CHECK", "true").lower() == "true"
+
+# Text check limits: share of ink pixels, and the mean length of horizontal
+# ink runs (stroke width) relative to the image width. Text is made of many
+# thin strokes, while a photo of skin binarizes into a few wide blobs.
+TEXT_MIN_INK = 0.002
+TEXT_MAX_INK = 0.5
+TEXT_MIN_RUNS = 50
+TEXT_MAX_RUN_FRACTION = 0.01
+
+logger = logging.getLogger(__name__)
+
+
+def load_grayscale(img, max_side=OCR_MAX_SIDE):
+    """
+    Decode an image to grayscale with its long side at about max_side pixels.
+
+    JPEGs are decoded directly at a reduced scale through Image.draft, so a
+    12 megapixel phone photo is never fully decoded. Images within 10% of
+    max_side are not resampled again.
+    """
+    if max(img.size) > max_side:
+        scale = max_side / max(img.size)
+        img.draft("L", (int(img.width * scale), int(img.height * scale)))
+    img = ImageOps.exif_transpose(img)
+    img = img.convert("L")
+    if max(img.size) > max_side * 1.1:
+        img.thumbnail((max_side, max_side), Image.Resampling.BILINEAR, reducing_gap=2.0)
+    return img
+
+
+def otsu_threshold(hist):
+    """
+    Return (threshold, separability) for a 256-bin grayscale histogram.
+
+    separability is the share of the intensity variance explained by the
+    split, from 0 (flat image) to 1 (perfectly two-toned).
+    """
+    hist = np.asarray(hist, dtype=np.float64)
+    prob = hist / hist.sum()
+    levels = np.arange(256, dtype=np.float64)
+    omega = np.cumsum(prob)
+    mu = np.cumsum(prob * levels)
+    mu_total = mu[-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        between = (mu_total * omega - mu) ** 2 / (omega * (1.0 - omega))
+    between = np.nan_to_num(between, nan=0.0, posinf=0.0)
+    threshold = int(np.argmax(between))
+    total_variance = float(np.sum(prob * (levels - mu_total) ** 2))
+    separability = float(between[threshold] / total_variance) if total_variance else 0.0
+    return threshold, separability
+
+
+def adaptive_threshold(gray, window=None, offset=10):
+    """
+    Binarize against the mean of a window around each pixel, computed with an
+    integral image. Handles uneven lighting better than one global threshold.
+
+    Returns a boolean array, True for background (white) pixels.
+    """
+    h, w = gray.shape
+    window = window or max(15, (min(h, w) // 30) | 1)
+    r = window // 2
+    integral = np.zeros((h + 1, w + 1), dtype=np.float64)
+    integral[1:, 1:] = gray.cumsum(axis=0, dtype=np.float64).cumsum(axis=1)
+    y0 = np.clip(np.arange(h) - r, 0, h)
+    y1 = np.clip(np.arange(h) + r + 1, 0, h)
+    x0 = np.clip(np.arange(w) - r, 0, w)
+    x1 = np.clip(np.arange(w) + r + 1, 0, w)
+    sums = (integral[np.ix_(y1, x1)] - integral[np.ix_(y0, x1)]
+            - integral[np.ix_(y1, x0)] + integral[np.ix_(y0, x0)])
+    area = np.outer(y1 - y0, x1 - x0)
+    return gray > (sums / area - offset)
+
+
+def binarize(gray_img, mode=OCR_THRESHOLD_MODE):
+    """
+    Binarize a grayscale PIL image with the configured mode.
+
+    Returns:
+        tuple: (background mask, separability), the mask True for white pixels
+    """
+    threshold, separability = otsu_threshold(gray_img.histogram())
+    gray = np.asarray(gray_img, dtype=np.uint8)
+    if mode == "adaptive":
+        return adaptive_threshold(gray), separability
+    if mode == "fixed":
+        return gray >= OCR_THRESHOLD, separability
+    return gray > threshold, separability
+
+
+def looks_like_text(background):
+    """Cheap check for whether a binarized image contains text at all."""
+    ink = ~background
+    ink_ratio = float(ink.mean())
+    if not TEXT_MIN_INK <= ink_ratio <= TEXT_MAX_INK:
+        return False
+    # Every horizontal ink run starts with a background -> ink step
+    runs = int(np.count_nonzero(ink[:, 1:] & ~ink[:, :-1])) + int(np.count_nonzero(ink[:, 0]))
+    if runs < TEXT_MIN_RUNS:
+        return False
+    mean_run = ink.sum() / runs
+    return mean_run <= max(8.0, background.shape[1] * TEXT_MAX_RUN_FRACTION)
+
+
+def estimate_skew(background, max_angle=OCR_DESKEW_MAX_ANGLE, step=0.25):
+    """
+    Estimate text skew in degrees from projection profiles, positive for text
+    rotated counter-clockwise.
+
+    Ink pixels of a reduced copy are projected onto the rows for every
+    candidate angle at once; the angle whose row histogram is sharpest
+    (highest sum of squares) lines the text up with the rows.
+    """
+    ink = ~background
+    factor = max(1, max(ink.shape) // 800)
+    ink = ink[::factor, ::factor]
+    ys, xs = np.nonzero(ink)
+    if len(ys) < TEXT_MIN_RUNS:
+        return 0.0
+    angles = np.arange(-max_angle, max_angle + step / 2, step)
+    radians = np.deg2rad(angles)[:, None]
+    rows = np.rint(ys[None, :] * np.cos(radians) - xs[None, :] * np.sin(radians)).astype(np.int64)
+    rows -= rows.min(axis=1, keepdims=True)
+    width = int(rows.max()) + 1
+    offsets = (np.arange(len(angles)) * width)[:, None]
+    hist = np.bincount((rows + offsets).ravel(), minlength=len(angles) * width)
+    scores = (hist.reshape(len(angles), width).astype(np.float64) ** 2).sum(axis=1)
+    # Row coordinates grow downwards, so the best angle is the clockwise skew
+    return -float(angles[int(np.argmax(scores))])
+
+
+def preprocess_for_ocr(img):
+    """
+    Prepare a PIL image for OCR.
+
+    Returns:
+        tuple: (binarized PIL image, has_text). has_text is False when
+        OCR_TEXT_CHECK is on and the image does not look like it holds text.
+    """
+    gray = load_grayscale(img)
+    background, separability = binarize(gray)
+    has_text = looks_like_text(background) if OCR_TEXT_CHECK else True
+    logger.info(f"OCR preprocessing: {gray.width}x{gray.height}, separability {separability:.2f}, text={has_text}")
+
+    # A boolean array converts straight to a 1-bit image
+    binary = Image.fromarray(background)
+    if has_text and OCR_DESKEW:
+        angle = estimate_skew(background)
+        if angle:
+            binary = binary.rotate(-angle, resample=Image.Resampling.NEAREST, expand=True, fillcolor=1)
+    return binary, has_text
@@ -1,38 +1,328 @@
-import requests
 import os
+import re
+import copy
+import json
+import time
+import random
+import hashlib
+import logging
+import threading
 
+import requests
+from requests.adapters import HTTPAdapter
 
-INFERMEDICA_APP_ID = os.getenv("INFERMEDICA_APP_ID")
-INFERMEDICA_APP_KEY = os.getenv("INFERMEDICA_APP_KEY")
+from call_metrics import CallMetrics
+from disk_cache import DiskCache
+from memory_cache import TieredCache
 
-def get_diagnosis(symptoms_text, sex="male", age=30, symptoms=None):
-    headers = {
-        'App-Id': INFERMEDICA_APP_ID,  # Replace with your Infermedica App-Id
-        'App-Key': INFERMEDICA_APP_KEY,  # Replace with your Infermedica App-Key
-        'Content-Type': 'application/json'
-    }
-    # Step 1: Parse symptoms from text and explicit symptoms
-    parse_data = {
-        "text": symptoms_text,
-        "sex": sex,
-        "age": {"value": age}
-    }
-    parse_response = requests.post("https://api.infermedica.com/v3/parse", headers=headers, json=parse_data)
-    parse_json = parse_response.json()
-    evidence = []
-    for mention in parse_json.get("mentions", []):
-        evidence.append({
-            "id": mention["id"],
-            "choice_id": mention["choice_id"]
-        })
-    # Add explicit symptoms if provided (implement mapping if needed)
-    # for s in symptoms: ... (optional)
-    if not evidence:
-        return {"conditions": []}
-    diagnosis_data = {
-        "sex": sex,
-        "age": {"value": age},
-        "evidence": evidence
+# Shared client for the Infermedica API. All calls go through one pooled
+# requests.Session, so connections are kept alive between calls instead of
+# doing a TCP and TLS handshake each time.
+#
+#   INFERMEDICA_CONNECT_TIMEOUT / INFERMEDICA_READ_TIMEOUT   seconds per attempt
+#   INFERMEDICA_RETRIES     extra attempts for idempotent calls on connection
+#                           errors, timeouts and 429/5xx responses
+#   INFERMEDICA_BACKOFF     base of the exponential backoff; each wait is a
+#                           random ("full jitter") share of it
+INFERMEDICA_API_URL = os.getenv("INFERMEDICA_API_URL", "https://api.infermedica.com/v3").rstrip("/")
+INFERMEDICA_CONNECT_TIMEOUT = float(os.getenv("INFERMEDICA_CONNECT_TIMEOUT", "3.05"))
+INFERMEDICA_READ_TIMEOUT = float(os.getenv("INFERMEDICA_READ_TIMEOUT", "10"))
+INFERMEDICA_RETRIES = int(os.getenv("INFERMEDICA_RETRIES", "2"))
+INFERMEDICA_BACKOFF = float(os.getenv("INFERMEDICA_BACKOFF", "0.25"))
+INFERMEDICA_POOL_SIZE = int(os.getenv("INFERMEDICA_POOL_SIZE", "10"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# /parse, /diagnosis and the lookups are computations without side effects,
+# so they can be retried even though some of them are POSTs
+IDEMPOTENT_PATHS = {"/parse", "/diagnosis", "/search", "/suggest", "/triage", "/symptoms", "/conditions"}
+# Recent latencies kept per endpoint for the percentiles in metrics()
+LATENCY_WINDOW = 512
+
+# /parse and /diagnosis answer the same inputs the same way until Infermedica
+# updates its medical model, so their results are cached: in the memory of
+# each worker and, with INFERMEDICA_CACHE_PATH set (the default), in a SQLite
+# file shared by all workers on the host (empty keeps them in memory only).
+# Entries expire after INFERMEDICA_CACHE_TTL seconds, a week by default, to
+# pick up model updates.
+INFERMEDICA_CACHE_ENABLED = os.getenv("INFERMEDICA_CACHE_ENABLED", "true").lower() == "true"
+INFERMEDICA_CACHE_TTL = int(os.getenv("INFERMEDICA_CACHE_TTL", str(7 * 24 * 3600)))
+INFERMEDICA_CACHE_ENTRIES = int(os.getenv("INFERMEDICA_CACHE_ENTRIES", "2048"))
+INFERMEDICA_CACHE_PATH = os.getenv(
+    "INFERMEDICA_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "infermedica.sqlite3")
+)
+INFERMEDICA_CACHE_MAX_BYTES = int(os.getenv("INFERMEDICA_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+# Bump when a change makes earlier cached results unsuitable
+INFERMEDICA_CACHE_VERSION = "1"
+WHITESPACE = re.compile(r"\s+")
+
+logger = logging.getLogger(__name__)
+
+
+class InfermedicaError(Exception):
+    """An Infermedica call failed after all attempts."""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def get_headers():
+    """Authentication headers, or None when the API keys are not set."""
+    app_id = os.getenv("INFERMEDICA_APP_ID")
+    app_key = os.getenv("INFERMEDICA_APP_KEY")
+    if not app_id or not app_key:
+        return None
+    return {
+        "App-Id": app_id,
+        "App-Key": app_key,
+        "Content-Type": "application/json",
     }
-    diagnosis_response = requests.post("https://api.infermedica.com/v3/diagnosis", headers=headers, json=diagnosis_data)
-    return diagnosis_response.json()
+
+
+def is_configured():
+    return get_headers() is not None
+
+
+# --- Metrics ---
+
+_metrics = CallMetrics(LATENCY_WINDOW)
+
+
+def _record(path, elapsed, outcome, attempts):
+    _metrics.record(path, elapsed, error=outcome != "ok", retries=attempts - 1)
+    logger.info(f"Infermedica {path} {outcome} in {elapsed * 1000:.0f} ms ({attempts} attempt{'s' if attempts > 1 else ''})")
+
+
+def metrics():
+    """Per-endpoint call counts, errors, retries and latency (ms) of this process."""
+    return _metrics.snapshot()
+
+
+def reset_metrics():
+    _metrics.reset()
+
+
+# --- Retry policy ---
+
+def _attempt_timeouts(deadline):
+    """(connect, read) timeouts for the next attempt, or None when the deadline has passed."""
+    if deadline is None:
+        return INFERMEDICA_CONNECT_TIMEOUT, INFERMEDICA_READ_TIMEOUT
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        return None
+    return min(INFERMEDICA_CONNECT_TIMEOUT, remaining), min(INFERMEDICA_READ_TIMEOUT, remaining)
+
+
+def _backoff(attempt, deadline):
+    """Seconds to wait before retry number attempt, or None if it would overrun the deadline."""
+    delay = random.uniform(0, INFERMEDICA_BACKOFF * (2 ** attempt))
+    if deadline is not None and time.monotonic() + delay >= deadline:
+        return None
+    return delay
+
+
+def _max_attempts(method, path, retries):
+    if retries is None:
+        retries = INFERMEDICA_RETRIES
+    idempotent = method == "GET" or path in IDEMPOTENT_PATHS
+    return 1 + (retries if idempotent else 0)
+
+
+def _error_message(status_code, text):
+    return f"Infermedica returned {status_code}: {text[:200]}"
+
+
+def _json_body(path, response):
+    """
+    The decoded body of a successful response. A 2xx that is not JSON (a
+    proxy's error page, a truncated body) raises InfermedicaError like any
+    other failed call.
+    """
+    try:
+        return response.json()
+    except ValueError:
+        raise InfermedicaError(
+            f"Infermedica {path} returned {response.status_code} with a body that is not JSON: "
+            f"{response.text[:200]}",
+            response.status_code
+        ) from None
+
+
+# --- Result cache ---
+
+result_cache = TieredCache(
+    INFERMEDICA_CACHE_ENTRIES,
+    ttl=INFERMEDICA_CACHE_TTL,
+    disk=DiskCache(INFERMEDICA_CACHE_PATH, INFERMEDICA_CACHE_MAX_BYTES, name="infermedica") if INFERMEDICA_CACHE_PATH else None,
+)
+
+
+def _digest(endpoint, payload):
+    data = json.dumps([INFERMEDICA_CACHE_VERSION, INFERMEDICA_API_URL, endpoint, payload], sort_keys=True)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def parse_key(text, sex, age):
+    """Cache key of a /parse call; runs of whitespace do not change it."""
+    return _digest("/parse", [WHITESPACE.sub(" ", text).strip(), sex, int(age)])
+
+
+def canonical_evidence(evidence):
+    """
+    The evidence as a sorted list of unique (id, choice_id, source, initial)
+    entries, so the same set of findings gives the same key in any order.
+    """
+    return sorted({
+        (item["id"], item.get("choice_id", "present"), item.get("source") or "", bool(item.get("initial")))
+        for item in evidence
+    })
+
+
+def diagnosis_key(evidence, sex, age):
+    """Cache key of a /diagnosis call, independent of the order of the evidence."""
+    return _digest("/diagnosis", [canonical_evidence(evidence), sex, int(age)])
+
+
+_cache_counts_lock = threading.Lock()
+_cache_counts = {"/parse": {"hits": 0, "misses": 0}, "/diagnosis": {"hits": 0, "misses": 0}}
+
+
+def _lookup(path, key):
+    if key is None:
+        result_cache.count_bypass()
+        return None
+    if not INFERMEDICA_CACHE_ENABLED:
+        return None
+    result = result_cache.get(key)
+    with _cache_counts_lock:
+        _cache_counts[path]["hits" if result is not None else "misses"] += 1
+    # Callers get their own copy, so changing it cannot alter the cache
+    return copy.deepcopy(result) if result is not None else None
+
+
+def _store(key, result):
+    if key is not None and INFERMEDICA_CACHE_ENABLED and result is not None:
+        result_cache.set(key, copy.deepcopy(result))
+
+
+def _cached(path, key, call):
+    """The cached result for key, or the result of call(), which is then cached."""
+    cached = _lookup(path, key)
+    if cached is not None:
+        return cached
+    result = call()
+    _store(key, result)
+    return result
+
+
+def cache_stats():
+    """Hit counts per endpoint and by tier, and the size of the /parse and /diagnosis result cache."""
+    with _cache_counts_lock:
+        endpoints = {
+            path: {**counts, "hit_rate": round(counts["hits"] / (counts["hits"] + counts["misses"]), 4)
+                   if counts["hits"] + counts["misses"] else 0.0}
+            for path, counts in _cache_counts.items()
+        }
+    return {"enabled": INFERMEDICA_CACHE_ENABLED, "endpoints": endpoints, **result_cache.stats()}
+
+
+# --- Sync client ---
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """The shared keep-alive session, created on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                # Retries are handled in request(), where they respect the deadline
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=INFERMEDICA_POOL_SIZE, max_retries=0)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def request(method, path, json=None, params=None, timeout=None, retries=None):
+    """
+    Call the Infermedica API and return the decoded JSON response.
+
+    Args:
+        method: HTTP method
+        path: Endpoint path, e.g. "/diagnosis"
+        json: Request body
+        params: Query parameters
+        timeout: Overall budget in seconds for all attempts, or None for the
+            per-attempt connect/read timeouts only
+        retries: Extra attempts for idempotent calls (default INFERMEDICA_RETRIES)
+
+    Raises:
+        InfermedicaError: when the keys are not set or every attempt failed
+    """
+    headers = get_headers()
+    if headers is None:
+        raise InfermedicaError("Infermedica API keys are not set")
+    deadline = time.monotonic() + timeout if timeout else None
+    max_attempts = _max_attempts(method, path, retries)
+    start = time.perf_counter()
+    attempt = 0
+    while True:
+        attempt += 1
+        timeouts = _attempt_timeouts(deadline)
+        if timeouts is None:
+            _record(path, time.perf_counter() - start, "timeout", attempt - 1)
+            raise InfermedicaError(f"Infermedica {path} timed out after {timeout}s")
+        try:
+            response = get_session().request(
+                method, INFERMEDICA_API_URL + path, headers=headers, json=json, params=params, timeout=timeouts
+            )
+            if response.status_code < 400:
+                try:
+                    data = _json_body(path, response)
+                except InfermedicaError:
+                    _record(path, time.perf_counter() - start, "invalid response", attempt)
+                    raise
+                _record(path, time.perf_counter() - start, "ok", attempt)
+                return data
+            error = InfermedicaError(_error_message(response.status_code, response.text), response.status_code)
+            outcome = f"error {response.status_code}"
+            retryable = response.status_code in RETRY_STATUSES
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = InfermedicaError(f"Infermedica {path} request failed: {e}")
+            outcome = "timeout" if isinstance(e, requests.Timeout) else "connection error"
+            retryable = True
+
+        delay = _backoff(attempt - 1, deadline) if retryable and attempt < max_attempts else None
+        if delay is None:
+            _record(path, time.perf_counter() - start, outcome, attempt)
+            raise error
+        logger.warning(f"Retrying Infermedica {path} in {delay:.2f}s: {error}")
+        time.sleep(delay)
+
+
+def parse(text, sex, age, timeout=None, use_cache=True):
+    """Find symptom mentions in free text."""
+    key = parse_key(text, sex, age) if use_cache else None
+    return _cached("/parse", key, lambda: request(
+        "POST", "/parse", json={"text": text, "sex": sex, "age": {"value": age}}, timeout=timeout
+    ))
+
+
+def diagnosis(evidence, sex, age, timeout=None, use_cache=True):
+    """Rank conditions for the given evidence."""
+    key = diagnosis_key(evidence, sex, age) if use_cache else None
+    return _cached("/diagnosis", key, lambda: request(
+        "POST", "/diagnosis", json={"sex": sex, "age": {"value": age}, "evidence": evidence}, timeout=timeout
+    ))
+
+
+def search(phrase, sex, age, max_results=8, types="symptom", timeout=None):
+    """Look up symptoms (or other concepts) by name."""
+    params = {"phrase": phrase, "sex": sex, "age.value": age, "max_results": max_results, "types": types}
+    return request("GET", "/search", params=params, timeout=timeout)
@@ -1,21 +1,15 @@
-import requests
 import os
 import logging
-import difflib
-from datetime import datetime
-from openai import OpenAI
 from dotenv import load_dotenv
+from openai_client import get_openai_response
+import infermedica_client
+import evidence_store
+import symptom_index
+from infermedica_client import InfermedicaError
 
 env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
 load_dotenv(dotenv_path=env_path)
 
-# Get API key from environment
-api_key = os.getenv("OPENAI_API_KEY")
-if not api_key:
-    logging.error("OPENAI_API_KEY not found in environment variables")
-    raise ValueError("OPENAI_API_KEY environment variable is not set")
-
-
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -23,147 +17,94 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-INFERMEDICA_API_URL = "https://api.infermedica.com/v3"
-INFERMEDICA_HEADERS = None
+def infermedica_diagnosis(state, user_message, timeout=None, should_stop=None):
+    """
+    Run the Infermedica /parse and /diagnosis calls for a message.
 
-def get_infermedica_headers():
-    global INFERMEDICA_HEADERS
-    if INFERMEDICA_HEADERS is not None:
-        return INFERMEDICA_HEADERS
-        
-    app_id = os.getenv("INFERMEDICA_APP_ID")
-    app_key = os.getenv("INFERMEDICA_APP_KEY")
+    Returns the formatted diagnosis text, or None when the engine is not
+    configured or finds no conditions. Unlike infermedica_conversational_flow
+    this never falls back to OpenAI, so it can run alongside an OpenAI call;
+    should_stop is then checked before each (metered) call, and returning
+    True skips the rest.
+    """
+    # Initialize state if not present
+    if not state:
+        state = {
+            "evidence": {},
+            "sex": "male",  # Default values
+            "age": 30
+        }
     
-    if not app_id or not app_key:
+    if not infermedica_client.is_configured():
         logger.error("Infermedica API keys are not set")
         return None
-        
-    INFERMEDICA_HEADERS = {
-        "App-Id": app_id,
-        "App-Key": app_key,
-        "Content-Type": "application/json"  
-    }
-    return INFERMEDICA_HEADERS
-
-client = OpenAI(api_key=api_key)
 
-def get_openai_response(text):
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "You are a highly knowledgeable and helpful medical assistant. "
-                        "Provide accurate, detailed, and well-researched answers to user queries about health and medical topics. "
-                        "Cite relevant sources or guidelines when possible. "
-                        "If the user requests, provide step-by-step explanations, lists, or summaries. "
-                        "Always maintain a professional, caring, and clear tone. "
-                        "If you are unsure, acknowledge limitations and recommend consulting a healthcare professional. "
-                        "If the user asks for more detail, expand your answer with additional context, examples, or references."
-                    )
-                },
-                {"role": "user", "content": text}
-            ],
-            temperature=0.7,
-            max_tokens=700
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        logging.error(f"OpenAI API error: {str(e)}")
+    if should_stop and should_stop():
         return None
-    
-def get_diagnosis(evidence, sex, age):
-    headers = get_infermedica_headers()
-    if not headers:
+    evidence = evidence_store.load(state)
+
+    # Short lists of known symptoms ("headache and fever") are resolved from
+    # the local symptom index; anything else goes to /parse
+    local_ids = symptom_index.resolve_message(user_message, sex=state["sex"])
+    if local_ids:
+        for symptom_id in local_ids:
+            evidence_store.record(evidence, symptom_id, "present", initial=True)
+    else:
+        # Parse the user message to extract symptoms
+        try:
+            parse_json = infermedica_client.parse(user_message, state["sex"], state["age"], timeout=timeout)
+
+            # Add any found symptoms to evidence; repeated symptoms are stored once
+            for mention in parse_json.get("mentions", []):
+                if mention.get("type") == "symptom":
+                    evidence_store.record(evidence, mention["id"], mention.get("choice_id", "present"), initial=True)
+        except InfermedicaError as e:
+            logger.error(f"Error in parse request: {str(e)}")
+
+    evidence_store.save(state, evidence)
+    if not evidence or (should_stop and should_stop()):
         return None
-        
+
+    # Get diagnosis
     try:
-        resp = requests.post(
-            f"{INFERMEDICA_API_URL}/diagnosis",
-            headers=headers,
-            json={
-                "sex": sex,
-                "age": {"value": age},
-                "evidence": evidence
-            }
+        diagnosis = infermedica_client.diagnosis(
+            evidence_store.to_payload(evidence), state["sex"], state["age"], timeout=timeout
         )
-        resp.raise_for_status()
-        return resp.json()
-    except Exception as e:
+    except InfermedicaError as e:
         logger.error(f"Diagnosis request error: {str(e)}")
         return None
+    
+    if diagnosis and diagnosis.get("conditions"):
+        # Format the diagnosis response
+        conditions = diagnosis["conditions"]
+        response = "Based on your symptoms, here are the possible conditions:\n\n"
+        
+        for condition in conditions[:3]:  # Show top 3 conditions
+            probability = round(condition["probability"] * 100, 1)
+            response += f"- {condition['common_name']} ({probability}% probability)\n"
+        
+        response += "\nRecommendations:\n"
+        response += "1. Please consult with a healthcare professional for proper diagnosis and treatment.\n"
+        response += "2. If symptoms worsen or you experience severe symptoms, seek immediate medical attention.\n"
+        
+        return response
+    return None
 
 def infermedica_conversational_flow(state, user_message, context=None, answers_dict=None, callback=None):
     try:
-        # Initialize state if not present
-        if not state:
-            state = {
-                "evidence": [],
-                "sex": "male",  # Default values
-                "age": 30
-            }
-        
-        # Get headers
-        headers = get_infermedica_headers()
-        if not headers:
+        if not infermedica_client.is_configured():
             return "Medical reasoning engine is not configured. Please contact the administrator."
 
-        # Parse the user message to extract symptoms
-        parse_payload = {
-            "text": user_message,
-            "sex": state["sex"],
-            "age": {"value": state["age"]}
-        }
-        
-        try:
-            parse_resp = requests.post(
-                f"{INFERMEDICA_API_URL}/parse",
-                json=parse_payload,
-                headers=headers
-            )
-            parse_resp.raise_for_status()
-            parse_json = parse_resp.json()
-            
-            # Add any found symptoms to evidence
-            if "mentions" in parse_json:
-                for mention in parse_json["mentions"]:
-                    if mention.get("type") == "symptom":
-                        symptom_id = mention["id"]
-                        choice_id = mention.get("choice_id", "present")
-                        state["evidence"].append({
-                            "id": symptom_id,
-                            "choice_id": choice_id,
-                            "initial": True
-                        })
-        except Exception as e:
-            logger.error(f"Error in parse request: {str(e)}")
-        
-        # Get diagnosis
-        diagnosis = get_diagnosis(state["evidence"], state["sex"], state["age"])
-        
-        if diagnosis and diagnosis.get("conditions"):
-            # Format the diagnosis response
-            conditions = diagnosis["conditions"]
-            response = "Based on your symptoms, here are the possible conditions:\n\n"
-            
-            for condition in conditions[:3]:  # Show top 3 conditions
-                probability = round(condition["probability"] * 100, 1)
-                response += f"- {condition['common_name']} ({probability}% probability)\n"
-            
-            response += "\nRecommendations:\n"
-            response += "1. Please consult with a healthcare professional for proper diagnosis and treatment.\n"
-            response += "2. If symptoms worsen or you experience severe symptoms, seek immediate medical attention.\n"
-            
+        response = infermedica_diagnosis(state, user_message)
+        if response:
             return response
+
+        # If no diagnosis from Infermedica, try OpenAI
+        openai_response = get_openai_response(user_message)
+        if openai_response:
+            return openai_response
         else:
-            # If no diagnosis from Infermedica, try OpenAI
-            openai_response = get_openai_response(user_message)
-            if openai_response:
-                return openai_response
-            else:
-                return "I apologize, but I couldn't provide a specific diagnosis. Please consult with a healthcare professional for proper medical advice."
+            return "I apologize, but I couldn't provide a specific diagnosis. Please consult with a healthcare professional for proper medical advice."
                 
     except Exception as e:
         logger.error(f"Error in conversation flow: {str(e)}")
@@ -0,0 +1,131 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+class MemoryCache:
+    """
+    Thread-safe in-process LRU cache with a per-entry TTL.
+
+    Holds at most max_entries values; adding one more drops the least
+    recently used. Expired entries are dropped when they are looked up.
+    """
+
+    def __init__(self, max_entries, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (entry[1] is not None and entry[1] < now):
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        ttl = ttl or self.ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            hits, misses, entries = self.hits, self.misses, len(self._entries)
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            "entries": entries,
+            "max_entries": self.max_entries,
+        }
+
+
+class TieredCache:
+    """
+    A MemoryCache in front of an optional DiskCache.
+
+    Lookups try this worker's memory first, then the disk tier shared by all
+    workers on the host; a disk hit is copied into memory for what is left
+    of its TTL. Writes go to both tiers. Both tiers expire entries after ttl
+    seconds.
+    """
+
+    def __init__(self, max_entries, ttl=None, disk=None):
+        self.memory = MemoryCache(max_entries, ttl)
+        self.disk = disk
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._counts = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "bypassed": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def get(self, key, default=None):
+        value = self.memory.get(key)
+        if value is not None:
+            self._count("memory_hits")
+            return value
+        if self.disk is not None:
+            value, expires_at = self.disk.lookup(key) or (None, None)
+            if value is not None:
+                ttl = None
+                if expires_at is not None:
+                    # At least a moment, since a ttl of 0 would mean the default
+                    ttl = max(expires_at - time.time(), 0.001)
+                self.memory.set(key, value, ttl=ttl)
+                self._count("disk_hits")
+                return value
+        self._count("misses")
+        return default
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value, ttl=self.ttl)
+
+    def count_bypass(self):
+        """Note a lookup the caller skipped on purpose, for stats()."""
+        self._count("bypassed")
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+        with self._lock:
+            self._counts = dict.fromkeys(self._counts, 0)
+
+    def stats(self):
+        """
+        Lookups of this worker by outcome, with the hit rate over both
+        tiers, plus the size of each tier. The disk figures cover all workers.
+        """
+        with self._lock:
+            counts = dict(self._counts)
+        hits = counts["memory_hits"] + counts["disk_hits"]
+        lookups = hits + counts["misses"]
+        return {
+            **counts,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "ttl": self.ttl,
+            "memory": self.memory.stats(),
+            "disk": self.disk.stats() if self.disk is not None else None,
+        }
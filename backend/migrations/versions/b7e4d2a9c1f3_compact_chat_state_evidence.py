@@ -0,0 +1,66 @@
+"""Store chat.state evidence in the compact, deduplicated form
+
+Revision ID: b7e4d2a9c1f3
+Revises: 3f9c2b7d41e6
+Create Date: 2026-10-18 21:05:37.902114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e4d2a9c1f3'
+down_revision = '3f9c2b7d41e6'
+branch_labels = None
+depends_on = None
+
+# Same format and cap as evidence_store at the time of this migration; kept
+# here so later changes to that module cannot change what the migration does
+MAX_ITEMS = 64
+CHOICE_CODES = {"present": "p", "absent": "a", "unknown": "u"}
+CHOICES = {code: choice for choice, code in CHOICE_CODES.items()}
+
+chat = sa.table('chat', sa.column('id', sa.Integer), sa.column('state', sa.JSON))
+
+
+def compact(items):
+    """List of Infermedica evidence objects -> {id: "p*"}, last write wins, capped."""
+    evidence = {}
+    for item in items:
+        symptom_id = item["id"]
+        previous = evidence.pop(symptom_id, None)
+        initial = bool(item.get("initial")) or bool(previous and previous.endswith("*"))
+        evidence[symptom_id] = CHOICE_CODES.get(item.get("choice_id", "present"), "p") + ("*" if initial else "")
+        while len(evidence) > MAX_ITEMS:
+            del evidence[next(iter(evidence))]
+    return evidence
+
+
+def expand(evidence):
+    """{id: "p*"} -> list of Infermedica evidence objects."""
+    items = []
+    for symptom_id, code in evidence.items():
+        item = {"id": symptom_id, "choice_id": CHOICES.get(code[:1], "present")}
+        if code.endswith("*"):
+            item["initial"] = True
+        items.append(item)
+    return items
+
+
+def convert(from_type, convert_evidence):
+    conn = op.get_bind()
+    rows = conn.execute(sa.select(chat.c.id, chat.c.state).where(chat.c.state.isnot(None))).fetchall()
+    for chat_id, state in rows:
+        if not isinstance(state, dict) or not isinstance(state.get("evidence"), from_type):
+            continue
+        state = dict(state, evidence=convert_evidence(state["evidence"]))
+        conn.execute(chat.update().where(chat.c.id == chat_id).values(state=state))
+
+
+def upgrade():
+    convert(list, compact)
+
+
+def downgrade():
+    convert(dict, expand)
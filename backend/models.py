@@ -28,4 +28,5 @@ class ChatMessage(db.Model):
     sender = db.Column(db.String(20))  # 'user' or 'ai'
     content = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    audio_file = db.Column(db.String(128), nullable=True)  # TTS file in static/audio, set once synthesized
 
@@ -0,0 +1,157 @@
+import os
+import shutil
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# OCR runs on a small pool of worker processes. Each worker initializes one
+# Tesseract API handle through tesserocr when it is installed and reuses it
+# for every image, so the traineddata is loaded once per worker instead of
+# once per image, and images are passed from memory rather than through temp
+# files. Without tesserocr the workers fall back to pytesseract, which runs
+# the tesseract executable for each image.
+OCR_ENGINE = os.getenv("OCR_ENGINE", "auto").lower()  # auto, tesserocr or pytesseract
+OCR_LANG = os.getenv("OCR_LANG", "eng")
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(min(os.cpu_count() or 1, 4))))
+TESSERACT_PATH = os.getenv("TESSERACT_PATH") or shutil.which("tesseract") or "/usr/bin/tesseract"
+
+logger = logging.getLogger(__name__)
+
+# Workers come from a fork server rather than a fork of the app process: the
+# pool is started lazily from a request thread while gunicorn's other threads
+# may hold locks, which a forked child would inherit locked
+_mp_context = multiprocessing.get_context("forkserver")
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# Tesseract handle of the current worker process, set up by _init_worker
+_api = None
+
+
+def _init_worker():
+    global _api
+    import pytesseract
+    pytesseract.pytesseract.tesseract_cmd = TESSERACT_PATH
+    if OCR_ENGINE == "pytesseract":
+        return
+    try:
+        import tesserocr
+        kwargs = {"lang": OCR_LANG}
+        if os.getenv("TESSDATA_PREFIX"):
+            kwargs["path"] = os.getenv("TESSDATA_PREFIX")
+        _api = tesserocr.PyTessBaseAPI(**kwargs)
+    except ImportError:
+        if OCR_ENGINE == "tesserocr":
+            logger.warning("OCR_ENGINE=tesserocr but tesserocr is not installed, using pytesseract")
+    except Exception as e:
+        logger.warning(f"Could not initialize tesserocr, using pytesseract: {e}")
+
+
+def _recognize(img):
+    """OCR a PIL image with the handle of the current worker."""
+    if _api is not None:
+        _api.SetImage(img)
+        return _api.GetUTF8Text()
+    import pytesseract
+    try:
+        return pytesseract.image_to_string(img, lang=OCR_LANG)
+    except pytesseract.TesseractNotFoundError as e:
+        # TesseractNotFoundError cannot be unpickled in the parent process,
+        # which would break the whole pool, so report it as FileNotFoundError
+        raise FileNotFoundError(str(e)) from None
+
+
+def _ocr_pdf_page(pdf_path, page_number, dpi):
+    """Rasterize a single page of a PDF file and OCR it inside a worker."""
+    from pdf2image import convert_from_path
+    images = convert_from_path(pdf_path, dpi=dpi, first_page=page_number, last_page=page_number)
+    return "".join(_recognize(img) for img in images)
+
+
+def get_pool():
+    """Return the shared OCR worker pool, starting it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=OCR_WORKERS, initializer=_init_worker, mp_context=_mp_context
+            )
+        return _pool
+
+
+def _restart_pool(broken):
+    """Drop a broken pool so the next get_pool() starts a fresh one."""
+    global _pool
+    with _pool_lock:
+        if _pool is not broken:
+            return
+        _pool = None
+    logger.warning("OCR worker pool is broken (a worker died), restarting it")
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _submit(fn, *args, retry=True, result=None):
+    """
+    Run fn on the pool and return a future for its result.
+
+    A worker killed by the OOM killer or crashing inside Tesseract breaks
+    the whole ProcessPoolExecutor, failing every pending call with
+    BrokenProcessPool. The pool is then replaced and the call resubmitted
+    once; the returned future follows the retry.
+    """
+    result = result or Future()
+    pool = get_pool()
+    try:
+        inner = pool.submit(fn, *args)
+    except BrokenProcessPool as e:
+        if not retry:
+            _settle(result, error=e)
+            return result
+        _restart_pool(pool)
+        return _submit(fn, *args, retry=False, result=result)
+
+    def done(inner):
+        if inner.cancelled():
+            result.cancel()
+            return
+        error = inner.exception()
+        if isinstance(error, BrokenProcessPool) and retry:
+            _restart_pool(pool)
+            _submit(fn, *args, retry=False, result=result)
+        else:
+            _settle(result, error=error, value=None if error else inner.result())
+
+    inner.add_done_callback(done)
+    return result
+
+
+def _settle(result, error=None, value=None):
+    """Complete result unless its caller has already cancelled it."""
+    if not result.set_running_or_notify_cancel():
+        return
+    if error is not None:
+        result.set_exception(error)
+    else:
+        result.set_result(value)
+
+
+def image_to_string(img, timeout=None):
+    """
+    OCR a PIL image on the worker pool.
+
+    Raises whatever the engine raised, e.g. FileNotFoundError when the
+    pytesseract fallback cannot find the tesseract executable.
+    """
+    return _submit(_recognize, img).result(timeout=timeout)
+
+
+def submit_pdf_page(pdf_path, page_number, dpi):
+    """
+    Queue OCR of one page of a PDF file on the worker pool and return its future.
+
+    Only the path crosses to the worker process, not the PDF itself.
+    """
+    return _submit(_ocr_pdf_page, pdf_path, page_number, dpi)
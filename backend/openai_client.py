@@ -1,8 +1,13 @@
 import os
-from openai import OpenAI
+import time
 import logging
+import threading
 from dotenv import load_dotenv
 
+import completion_cache
+import similarity_cache
+from call_metrics import CallMetrics
+
 # Load environment variables from .env file
 env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
 load_dotenv(dotenv_path=env_path)
@@ -13,32 +18,266 @@ if not api_key:
     logging.error("OPENAI_API_KEY not found in environment variables")
     raise ValueError("OPENAI_API_KEY environment variable is not set")
 
-# Initialize OpenAI client
-client = OpenAI(api_key=api_key)
+# Every OpenAI call in the backend goes through this module. It owns the one
+# client, gives each call a deadline (OPENAI_TIMEOUT unless the caller passes
+# its own), and caps the calls in flight per worker at OPENAI_MAX_CONCURRENCY
+# so a burst of chat messages queues here instead of running into the rate
+# limit. A call that cannot get a slot before its deadline fails without
+# reaching the API. The SDK would apply the timeout to each of its retries,
+# so its own retries are off; failed attempts (connection errors, 429, 5xx)
+# are retried here up to OPENAI_MAX_RETRIES times, and only while the
+# backoff still leaves time before the deadline.
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o")
+OPENAI_IMAGE_MODEL = os.getenv("OPENAI_IMAGE_MODEL", "dall-e-2")
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "25"))
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "8"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "1"))
+OPENAI_RETRY_BACKOFF = 0.5  # seconds before the first retry, doubled after each
+
+logger = logging.getLogger(__name__)
+
+_slots = threading.BoundedSemaphore(OPENAI_MAX_CONCURRENCY)
+_metrics = CallMetrics()
+
+# The openai package takes a large share of boot time, so the client is only
+# created, and the package imported, on the first call
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Return the shared OpenAI client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from openai import OpenAI
+                _client = OpenAI(api_key=api_key, max_retries=0, timeout=OPENAI_TIMEOUT)
+    return _client
+
+SYSTEM_PROMPT = (
+    "You are a highly knowledgeable and helpful medical assistant. "
+    "Provide accurate, detailed, and well-researched answers to user queries about health and medical topics. "
+    "Cite relevant sources or guidelines when possible. "
+    "If the user requests, provide step-by-step explanations, lists, or summaries. "
+    "Always maintain a professional, caring, and clear tone. "
+    "If you are unsure, acknowledge limitations and recommend consulting a healthcare professional. "
+    "If the user asks for more detail, expand your answer with additional context, examples, or references."
+)
+
+def metrics():
+    """
+    Call counts, errors, latency (ms) and token usage per operation of this
+    worker, plus slot_wait (time spent queued for a concurrency slot; errors
+    are calls that got none before their deadline) and
+    chat_stream_first_token (time to the first streamed token).
+    """
+    return _metrics.snapshot()
+
+def _acquire_slot(timeout):
+    """
+    Wait for a free concurrency slot. Returns the deadline of the call (in
+    time.monotonic() seconds) and the seconds spent waiting; raises
+    TimeoutError when no slot frees up within timeout.
+    """
+    deadline = time.monotonic() + (timeout or OPENAI_TIMEOUT)
+    waited = time.perf_counter()
+    if not _slots.acquire(timeout=max(deadline - time.monotonic(), 0)):
+        _metrics.record("slot_wait", time.perf_counter() - waited, error=True)
+        raise TimeoutError(f"No OpenAI slot became free within {timeout or OPENAI_TIMEOUT}s")
+    waited = time.perf_counter() - waited
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        _slots.release()
+        raise TimeoutError("OpenAI deadline passed while waiting for a slot")
+    return deadline, waited
+
+def _retryable(error):
+    import openai
+    if isinstance(error, openai.APITimeoutError):
+        # The attempt already used up the deadline
+        return False
+    return isinstance(error, (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError))
+
+def _call_with_retries(deadline, call):
+    """
+    Return call(api) with api bound to what is left of the deadline,
+    retrying failed attempts while the backoff fits before the deadline.
+    """
+    attempt = 0
+    while True:
+        api = get_client().with_options(timeout=max(deadline - time.monotonic(), 0.001))
+        try:
+            return call(api)
+        except Exception as e:
+            delay = OPENAI_RETRY_BACKOFF * 2 ** attempt
+            if attempt >= OPENAI_MAX_RETRIES or not _retryable(e) or time.monotonic() + delay >= deadline:
+                raise
+            attempt += 1
+            logger.warning(f"Retrying OpenAI call in {delay:.1f}s: {e}")
+            time.sleep(delay)
+
+def _record(operation, start, waited, error=False, usage=None):
+    elapsed = time.perf_counter() - start
+    tokens = {}
+    if usage is not None:
+        tokens = {"prompt_tokens": usage.prompt_tokens or 0, "completion_tokens": usage.completion_tokens or 0}
+    _metrics.record(operation, elapsed, error=error, **tokens)
+    _metrics.record("slot_wait", waited)
+    logger.info(
+        f"OpenAI {operation} {'failed' if error else 'ok'} in {elapsed * 1000:.0f} ms "
+        f"(waited {waited * 1000:.0f} ms, tokens {tokens or 'n/a'})"
+    )
+
+def chat_completion(messages, model=None, temperature=0.7, max_tokens=700, timeout=None):
+    """
+    Run a chat completion and return the reply text.
+
+    timeout is the deadline in seconds for the whole call, including the wait
+    for a concurrency slot (default OPENAI_TIMEOUT). Errors are raised.
+    """
+    start = time.perf_counter()
+    deadline, waited = _acquire_slot(timeout)
+    try:
+        response = _call_with_retries(deadline, lambda api: api.chat.completions.create(
+            model=model or OPENAI_MODEL,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens
+        ))
+    except Exception:
+        _slots.release()
+        _record("chat", start, waited, error=True)
+        raise
+    _slots.release()
+    _record("chat", start, waited, usage=response.usage)
+    return response.choices[0].message.content.strip()
 
-def get_openai_response(text):
+def stream_chat_completion(messages, model=None, temperature=0.7, max_tokens=700, timeout=None):
+    """
+    Stream a chat completion, yielding content deltas as the model produces
+    them. The concurrency slot is held until the stream ends or is closed.
+    Errors are raised.
+    """
+    start = time.perf_counter()
+    deadline, waited = _acquire_slot(timeout)
+    usage = None
+    first_token = False
+    error = True
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "You are a highly knowledgeable and helpful medical assistant. "
-                        "Provide accurate, detailed, and well-researched answers to user queries about health and medical topics. "
-                        "Cite relevant sources or guidelines when possible. "
-                        "If the user requests, provide step-by-step explanations, lists, or summaries. "
-                        "Always maintain a professional, caring, and clear tone. "
-                        "If you are unsure, acknowledge limitations and recommend consulting a healthcare professional. "
-                        "If the user asks for more detail, expand your answer with additional context, examples, or references."
-                    )
-                },
-                {"role": "user", "content": text}
-            ],
-            temperature=0.7,
-            max_tokens=700
+        # Only opening the stream is retried; nothing has been yielded yet
+        stream = _call_with_retries(deadline, lambda api: api.chat.completions.create(
+            model=model or OPENAI_MODEL,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True,
+            stream_options={"include_usage": True}
+        ))
+        for chunk in stream:
+            if chunk.usage:
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if not first_token:
+                    first_token = True
+                    _metrics.record("chat_stream_first_token", time.perf_counter() - start)
+                yield delta
+        error = False
+    finally:
+        _slots.release()
+        _record("chat_stream", start, waited, error=error, usage=usage)
+
+def generate_image(prompt, size="512x512", timeout=None):
+    """Generate one image for the prompt and return its URL. Errors are raised."""
+    start = time.perf_counter()
+    deadline, waited = _acquire_slot(timeout)
+    try:
+        response = _call_with_retries(
+            deadline, lambda api: api.images.generate(model=OPENAI_IMAGE_MODEL, prompt=prompt, n=1, size=size)
+        )
+    except Exception:
+        _slots.release()
+        _record("image", start, waited, error=True)
+        raise
+    _slots.release()
+    _record("image", start, waited)
+    return response.data[0].url
+
+CHAT_TEMPERATURE = 0.7
+CHAT_MAX_TOKENS = 700
+
+def medical_messages(text):
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": text}
+    ]
+
+# Replies that decline to answer; the chat falls back to Infermedica for
+# these, and they are never cached, so the question is asked again next time
+REFUSAL_PHRASES = ["i don't know", "i'm sorry", "i am not sure", "as an ai", "i cannot"]
+
+def is_acceptable_response(text):
+    return bool(text) and not any(phrase in text.lower() for phrase in REFUSAL_PHRASES)
+
+def _completion_key(text, use_cache):
+    """Completion cache key for a medical question, or None when the cache is bypassed."""
+    if not use_cache:
+        completion_cache.count_bypass()
+        return None
+    return completion_cache.cache_key(OPENAI_MODEL, SYSTEM_PROMPT, text, CHAT_TEMPERATURE, CHAT_MAX_TOKENS)
+
+def get_openai_response(text, timeout=None, use_cache=True):
+    """
+    Answer a medical question, or return None when the call fails.
+
+    Answers are served from the completion cache when the same question was
+    asked before, or from the similarity cache as a SimilarAnswer when a
+    question worded differently was. use_cache=False always asks the model
+    (and does not store the answer).
+    """
+    key = _completion_key(text, use_cache)
+    if key:
+        cached = completion_cache.lookup(key) or similarity_cache.lookup(text)
+        if cached is not None:
+            return cached
+    try:
+        reply = chat_completion(
+            medical_messages(text), temperature=CHAT_TEMPERATURE, max_tokens=CHAT_MAX_TOKENS, timeout=timeout
         )
-        return response.choices[0].message.content.strip()
     except Exception as e:
         logging.error(f"OpenAI API error: {str(e)}")
-        return None
\ No newline at end of file
+        return None
+    if key and is_acceptable_response(reply):
+        completion_cache.store(key, reply)
+        similarity_cache.remember(text, reply)
+    return reply
+
+def stream_openai_response(text, timeout=None, use_cache=True):
+    """
+    Stream a completion for the given text, yielding content deltas as the
+    model produces them. Errors are raised to the caller, which has to tell
+    the client the stream failed.
+
+    A cached answer is yielded as a single delta (a SimilarAnswer when it
+    comes from the similarity cache). A streamed answer is stored in the
+    caches once the stream has completed.
+    """
+    key = _completion_key(text, use_cache)
+    if key:
+        cached = completion_cache.lookup(key) or similarity_cache.lookup(text)
+        if cached is not None:
+            yield cached
+            return
+    parts = []
+    for delta in stream_chat_completion(
+        medical_messages(text), temperature=CHAT_TEMPERATURE, max_tokens=CHAT_MAX_TOKENS, timeout=timeout
+    ):
+        parts.append(delta)
+        yield delta
+    if key:
+        reply = "".join(parts).strip()
+        if is_acceptable_response(reply):
+            completion_cache.store(key, reply)
+            similarity_cache.remember(text, reply)
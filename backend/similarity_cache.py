@@ -0,0 +1,214 @@
+import os
+import re
+import time
+import hashlib
+import logging
+import threading
+import unicodedata
+
+# Reuse of OpenAI answers for questions that are worded differently but ask
+# the same thing ("I have a headache and fever" / "fever with headache").
+# Questions are turned into TF-IDF vectors over their content words, hashed
+# into SIMILARITY_DIM buckets so no vocabulary has to be kept, and compared
+# by cosine similarity with every indexed question. The best match at or
+# above SIMILARITY_THRESHOLD is reused. The index lives in the memory of
+# each worker and holds the SIMILARITY_CACHE_ENTRIES most recent answers;
+# the oldest is overwritten when it is full. Entries expire sooner than
+# exact completions, since they answer questions nobody asked word for word.
+SIMILARITY_CACHE_ENABLED = os.getenv("SIMILARITY_CACHE_ENABLED", "true").lower() == "true"
+SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.9"))
+SIMILARITY_CACHE_ENTRIES = int(os.getenv("SIMILARITY_CACHE_ENTRIES", "2000"))
+SIMILARITY_CACHE_TTL = int(os.getenv("SIMILARITY_CACHE_TTL", str(6 * 3600)))
+SIMILARITY_DIM = 2048
+
+STOPWORDS = frozenset("""
+a about above after again all am an and any are as at be been being before below between both but by
+can could did do does doing during each few for from further had has have having he her here hers him
+his how i if in into is it its itself just me more most my myself of on once only or other our ours
+out over own please same she should so some such than that the their theirs them then there these they
+this those through to too under until up very was we were what when where which while who whom why
+will with would you your yours yourself tell know get got feel feeling im ive
+""".split())
+# Words that flip the meaning of what follows, up to the end of the clause;
+# the words after them are indexed as "no_<word>"
+NEGATIONS = frozenset("no not without never dont doesnt didnt cant cannot isnt arent wasnt havent hasnt".split())
+CLAUSE_BREAK = re.compile(r"[.,;:!?]|\bbut\b")
+WORD = re.compile(r"[a-z0-9]+")
+
+logger = logging.getLogger(__name__)
+
+
+class SimilarAnswer(str):
+    """An answer reused from a similar question; behaves like the answer text."""
+
+    def __new__(cls, answer, question, similarity):
+        obj = super().__new__(cls, answer)
+        obj.question = question
+        obj.similarity = similarity
+        return obj
+
+    def match(self):
+        return {"question": self.question, "similarity": round(self.similarity, 4)}
+
+
+def tokenize(text):
+    """Content words of text, lightly stemmed, with negated words marked."""
+    text = unicodedata.normalize("NFKC", text).casefold().replace("'", "").replace("’", "")
+    tokens = []
+    for clause in CLAUSE_BREAK.split(text):
+        negated = False
+        for word in WORD.findall(clause):
+            if word in NEGATIONS:
+                negated = True
+                continue
+            if word in STOPWORDS:
+                continue
+            if len(word) > 4 and word.endswith("s") and not word.endswith("ss"):
+                word = word[:-1]
+            tokens.append("no_" + word if negated else word)
+    return tokens
+
+
+def _bucket(token):
+    # A stable hash, so vectors agree across processes; the sign bit makes
+    # bucket collisions cancel out on average instead of adding up
+    value = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+    return value % SIMILARITY_DIM, 1.0 if value >> 63 else -1.0
+
+
+def term_vector(text):
+    """Signed, sublinear term-frequency vector of text (float32, SIMILARITY_DIM long)."""
+    import numpy as np
+    counts = {}
+    for token in tokenize(text):
+        counts[token] = counts.get(token, 0) + 1
+    vector = np.zeros(SIMILARITY_DIM, dtype=np.float32)
+    for token, count in counts.items():
+        bucket, sign = _bucket(token)
+        vector[bucket] += sign * (1.0 + np.log(count))
+    return vector
+
+
+class SimilarityIndex:
+    """
+    Fixed-size in-memory index of (question, answer) pairs searched by
+    TF-IDF cosine similarity. Document frequencies are updated as questions
+    are added and replaced, so the IDF weights follow what is asked.
+    """
+
+    def __init__(self, max_entries=SIMILARITY_CACHE_ENTRIES, ttl=SIMILARITY_CACHE_TTL):
+        import numpy as np
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._tf = np.zeros((max_entries, SIMILARITY_DIM), dtype=np.float32)
+        self._df = np.zeros(SIMILARITY_DIM, dtype=np.float32)
+        self._expires = np.zeros(max_entries, dtype=np.float64)
+        self._questions = [None] * max_entries
+        self._answers = [None] * max_entries
+        self._next = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, question, answer):
+        vector = term_vector(question)
+        if not vector.any():
+            return
+        with self._lock:
+            slot = self._next
+            if self._questions[slot] is not None:
+                self._df -= self._tf[slot] != 0
+            else:
+                self._size += 1
+            self._tf[slot] = vector
+            self._df += vector != 0
+            self._expires[slot] = time.monotonic() + self.ttl if self.ttl else float("inf")
+            self._questions[slot] = question
+            self._answers[slot] = answer
+            self._next = (slot + 1) % self.max_entries
+
+    def search(self, question, threshold=SIMILARITY_THRESHOLD):
+        """
+        The answer of the most similar live entry as a SimilarAnswer, or None
+        when no entry reaches threshold.
+        """
+        import numpy as np
+        query = term_vector(question)
+        if not query.any():
+            return None
+        with self._lock:
+            if not self._size:
+                return None
+            # Unused slots have expiry 0, so this also skips them
+            rows = np.flatnonzero(self._expires > time.monotonic())
+            if not len(rows):
+                return None
+            idf = np.log((1.0 + self._size) / (1.0 + self._df)) + 1.0
+            weighted = self._tf[rows] * idf
+            query = query * idf
+            norms = np.linalg.norm(weighted, axis=1) * np.linalg.norm(query)
+            scores = (weighted @ query) / np.maximum(norms, 1e-12)
+            best = int(np.argmax(scores))
+            score = float(scores[best])
+            if score < threshold:
+                return None
+            slot = rows[best]
+            return SimilarAnswer(self._answers[slot], self._questions[slot], score)
+
+    def clear(self):
+        with self._lock:
+            self._tf[:] = 0
+            self._df[:] = 0
+            self._expires[:] = 0
+            self._questions = [None] * self.max_entries
+            self._answers = [None] * self.max_entries
+            self._next = self._size = 0
+
+
+# NumPy is only imported, and the index allocated, on first use
+_index = None
+_index_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+
+def get_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = SimilarityIndex()
+    return _index
+
+
+def lookup(question):
+    """A SimilarAnswer for a previously answered similar question, or None."""
+    if not SIMILARITY_CACHE_ENABLED:
+        return None
+    answer = get_index().search(question)
+    with _stats_lock:
+        _stats["hits" if answer is not None else "misses"] += 1
+    if answer is not None:
+        logger.info(f"Similarity cache hit ({answer.similarity:.3f}): {question!r} ~ {answer.question!r}")
+    return answer
+
+
+def remember(question, answer):
+    if SIMILARITY_CACHE_ENABLED and answer:
+        get_index().add(question, answer)
+
+
+def stats():
+    with _stats_lock:
+        hits, misses = _stats["hits"], _stats["misses"]
+    return {
+        "enabled": SIMILARITY_CACHE_ENABLED,
+        "threshold": SIMILARITY_THRESHOLD,
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+        "entries": len(_index) if _index is not None else 0,
+        "max_entries": SIMILARITY_CACHE_ENTRIES,
+    }
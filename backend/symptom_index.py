@@ -0,0 +1,316 @@
+import os
+import re
+import json
+import time
+import bisect
+import logging
+import tempfile
+import threading
+import unicodedata
+from collections import defaultdict
+
+import infermedica_client
+from similarity_cache import NEGATIONS
+
+# Local copy of Infermedica's symptom catalog, used to resolve common symptom
+# phrases ("headache", "sore throat, fever") to symptom ids without calling
+# /parse or /search, and to suggest symptom names as the user types.
+# `flask sync-symptoms` downloads the catalog into SYMPTOM_CATALOG_PATH; until
+# it has run, every phrase falls back to the remote endpoints.
+#
+# A phrase resolves when its words match a symptom name exactly (in any
+# order), or when its character trigrams are at least SYMPTOM_MATCH_THRESHOLD
+# similar (Dice) to one symptom and clearly closer to it than to any other.
+SYMPTOM_INDEX_ENABLED = os.getenv("SYMPTOM_INDEX_ENABLED", "true").lower() == "true"
+SYMPTOM_CATALOG_PATH = os.getenv(
+    "SYMPTOM_CATALOG_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "symptoms.json")
+)
+SYMPTOM_MATCH_THRESHOLD = float(os.getenv("SYMPTOM_MATCH_THRESHOLD", "0.85"))
+# How much closer the best symptom has to be than the runner-up
+SYMPTOM_MATCH_MARGIN = 0.05
+# Longer messages are left to /parse, which understands context and durations
+MAX_LOCAL_PHRASES = 6
+MAX_PHRASE_WORDS = 5
+
+PHRASE_BREAK = re.compile(r",|;|/|\band\b|\bor\b|\bplus\b|&")
+NON_WORD = re.compile(r"[^a-z0-9]+")
+# Words that can start a phrase without changing the symptom it names
+FILLERS = frozenset("i im ive have has had having a an my some the got get getting feel feeling am been also with".split())
+
+logger = logging.getLogger(__name__)
+
+
+def normalize(phrase):
+    """Lowercased words of phrase without punctuation, plurals stripped."""
+    text = unicodedata.normalize("NFKC", phrase).casefold().replace("'", "").replace("’", "")
+    words = []
+    for word in NON_WORD.sub(" ", text).split():
+        if len(word) > 4 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.append(word)
+    return words
+
+
+def strip_fillers(words):
+    start = 0
+    while start < len(words) and words[start] in FILLERS:
+        start += 1
+    return words[start:]
+
+
+def split_phrases(text):
+    """Split symptom text on commas, "and", "or" and similar into phrases."""
+    return [phrase.strip() for phrase in PHRASE_BREAK.split(text.lower()) if phrase.strip()]
+
+
+def trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SymptomIndex:
+    """
+    In-memory index over the symptom catalog: exact and word-order-free
+    lookup, a trigram index for near matches, and a sorted list of name
+    suffixes starting at word boundaries for prefix suggestions.
+    """
+
+    def __init__(self, symptoms):
+        self.entries = []  # (id, name, sex_filter)
+        self.exact = defaultdict(set)
+        self.grams = defaultdict(list)
+        self.gram_counts = []
+        prefixes = []
+        for symptom in symptoms:
+            names = {symptom.get("common_name"), symptom.get("name")} - {None, ""}
+            for name in names:
+                words = normalize(name)
+                if not words:
+                    continue
+                index = len(self.entries)
+                self.entries.append((symptom["id"], name, symptom.get("sex_filter", "both")))
+                key = " ".join(sorted(words))
+                self.exact[" ".join(words)].add(index)
+                self.exact[key].add(index)
+                grams = trigrams(key)
+                self.gram_counts.append(len(grams))
+                for gram in grams:
+                    self.grams[gram].append(index)
+                for start in range(len(words)):
+                    prefixes.append((" ".join(words[start:]), start, index))
+        prefixes.sort()
+        self.prefix_keys = [p[0] for p in prefixes]
+        self.prefix_entries = [(p[1], p[2]) for p in prefixes]
+
+    def __len__(self):
+        return len({entry[0] for entry in self.entries})
+
+    def _allowed(self, index, sex):
+        return not sex or self.entries[index][2] in ("both", sex)
+
+    def resolve(self, phrase, sex=None):
+        """
+        The symptom a phrase names, as {"id", "name", "score"}, or None when
+        there is no confident local match.
+        """
+        words = strip_fillers(normalize(phrase))
+        if not words or len(words) > MAX_PHRASE_WORDS or NEGATIONS.intersection(words):
+            return None
+        for key in (" ".join(words), " ".join(sorted(words))):
+            matches = {i for i in self.exact.get(key, ()) if self._allowed(i, sex)}
+            ids = {self.entries[i][0] for i in matches}
+            if len(ids) == 1:
+                index = min(matches)
+                return {"id": self.entries[index][0], "name": self.entries[index][1], "score": 1.0}
+            if len(ids) > 1:
+                return None
+
+        # Near match: Dice similarity of trigram sets, via the posting lists
+        query = trigrams(" ".join(sorted(words)))
+        shared = defaultdict(int)
+        for gram in query:
+            for index in self.grams.get(gram, ()):
+                shared[index] += 1
+        best = {}
+        for index, count in shared.items():
+            if not self._allowed(index, sex):
+                continue
+            score = 2.0 * count / (len(query) + self.gram_counts[index])
+            symptom_id = self.entries[index][0]
+            if score > best.get(symptom_id, (0.0, None))[0]:
+                best[symptom_id] = (score, index)
+        if not best:
+            return None
+        ranked = sorted(best.values(), reverse=True)
+        score, index = ranked[0]
+        runner_up = ranked[1][0] if len(ranked) > 1 else 0.0
+        if score < SYMPTOM_MATCH_THRESHOLD or score - runner_up < SYMPTOM_MATCH_MARGIN:
+            return None
+        return {"id": self.entries[index][0], "name": self.entries[index][1], "score": round(score, 4)}
+
+    def suggest(self, prefix, limit=8, sex=None):
+        """
+        Symptoms with a word starting with prefix, names that start with it
+        first, then shorter names first.
+        """
+        key = " ".join(normalize(prefix))
+        if not key:
+            return []
+        # Keep a trailing space out of the key so "head" still finds "headache"
+        start = bisect.bisect_left(self.prefix_keys, key)
+        candidates = {}
+        for position in range(start, len(self.prefix_keys)):
+            if not self.prefix_keys[position].startswith(key):
+                break
+            word_start, index = self.prefix_entries[position]
+            if not self._allowed(index, sex):
+                continue
+            symptom_id, name, _ = self.entries[index]
+            rank = (word_start > 0, len(name), name)
+            if symptom_id not in candidates or rank < candidates[symptom_id][0]:
+                candidates[symptom_id] = (rank, name)
+        ranked = sorted(candidates.items(), key=lambda item: item[1][0])
+        return [{"id": symptom_id, "name": name} for symptom_id, (_, name) in ranked[:limit]]
+
+
+# --- Catalog ---
+
+_index = None
+_index_lock = threading.Lock()
+_catalog_info = {}
+_stats_lock = threading.Lock()
+_stats = {"phrases_local": 0, "phrases_remote": 0, "parse_avoided": 0, "parse_called": 0}
+
+
+def sync_catalog(age=30, path=None):
+    """
+    Download the symptom catalog from Infermedica and store it atomically.
+
+    Returns:
+        int: number of symptoms stored
+    """
+    path = path or SYMPTOM_CATALOG_PATH
+    symptoms = infermedica_client.request("GET", "/symptoms", params={"age.value": age}, timeout=60)
+    catalog = {
+        "fetched_at": time.time(),
+        "api_url": infermedica_client.INFERMEDICA_API_URL,
+        "symptoms": [
+            {key: symptom.get(key) for key in ("id", "name", "common_name", "sex_filter")}
+            for symptom in symptoms
+        ],
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(catalog, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    reload()
+    return len(catalog["symptoms"])
+
+
+def load_index(path=None):
+    """Build a SymptomIndex from the catalog file; an empty index if there is none."""
+    path = path or SYMPTOM_CATALOG_PATH
+    try:
+        with open(path, encoding="utf-8") as f:
+            catalog = json.load(f)
+    except FileNotFoundError:
+        logger.info(f"No symptom catalog at {path}; run `flask sync-symptoms` to enable local matching")
+        return SymptomIndex([]), {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read symptom catalog {path}: {e}")
+        return SymptomIndex([]), {}
+    start = time.perf_counter()
+    index = SymptomIndex(catalog.get("symptoms", []))
+    logger.info(f"Symptom index: {len(index)} symptoms built in {(time.perf_counter() - start) * 1000:.0f} ms")
+    return index, {"fetched_at": catalog.get("fetched_at"), "path": path}
+
+
+def get_index():
+    """The shared index, built from the catalog file on first use."""
+    global _index, _catalog_info
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index, _catalog_info = load_index()
+    return _index
+
+
+def reload():
+    global _index
+    with _index_lock:
+        _index = None
+    return get_index()
+
+
+def _count(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+
+def resolve_phrases(phrases, sex=None):
+    """
+    Resolve each phrase locally.
+
+    Returns:
+        tuple: (matches, unresolved) where matches maps each resolved phrase
+        to {"id", "name", "score"} and unresolved lists the other phrases
+    """
+    matches, unresolved = {}, []
+    index = get_index() if SYMPTOM_INDEX_ENABLED else None
+    for phrase in phrases:
+        match = index.resolve(phrase, sex=sex) if index is not None else None
+        if match:
+            matches[phrase] = match
+        else:
+            unresolved.append(phrase)
+    _count("phrases_local", len(matches))
+    _count("phrases_remote", len(unresolved))
+    return matches, unresolved
+
+
+def resolve_message(text, sex=None):
+    """
+    Symptom ids for a chat message made only of symptom phrases
+    ("headache and fever"), or None when any part of it needs /parse.
+    """
+    phrases = split_phrases(text)
+    if not SYMPTOM_INDEX_ENABLED or not phrases or len(phrases) > MAX_LOCAL_PHRASES:
+        _count("parse_called")
+        return None
+    index = get_index()
+    matches = [index.resolve(phrase, sex=sex) for phrase in phrases]
+    if not all(matches):
+        _count("parse_called")
+        return None
+    _count("parse_avoided")
+    return [match["id"] for match in matches]
+
+
+def suggest(prefix, limit=8, sex=None):
+    if not SYMPTOM_INDEX_ENABLED:
+        return []
+    return get_index().suggest(prefix, limit=limit, sex=sex)
+
+
+def stats():
+    """Catalog size and age, and how many lookups were answered locally."""
+    index = get_index()
+    with _stats_lock:
+        counts = dict(_stats)
+    phrases = counts["phrases_local"] + counts["phrases_remote"]
+    messages = counts["parse_avoided"] + counts["parse_called"]
+    fetched_at = _catalog_info.get("fetched_at")
+    return {
+        "enabled": SYMPTOM_INDEX_ENABLED,
+        "symptoms": len(index),
+        "catalog_age_days": round((time.time() - fetched_at) / 86400, 1) if fetched_at else None,
+        **counts,
+        "phrase_local_rate": round(counts["phrases_local"] / phrases, 4) if phrases else 0.0,
+        "parse_avoided_rate": round(counts["parse_avoided"] / messages, 4) if messages else 0.0,
+    }
@@ -0,0 +1,109 @@
+"""
+Tests of the chat response engines in app.py (CHAT_RESPONSE_MODE "serial"
+and "concurrent"), with OpenAI and Infermedica replaced by stubs.
+
+    cd backend
+    python -m pytest test_chat_engines.py
+"""
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.gettempdir(), "test_chat_engines.sqlite3"))
+
+import pytest
+
+import app as backend
+import infermedica_client
+import infermedica_conversation
+import symptom_index
+
+ANSWER = "Rest and drink plenty of fluids."
+REFUSAL = "I'm sorry, I cannot help with that."
+DIAGNOSIS = {"conditions": [{"common_name": "Common cold", "probability": 0.6}]}
+
+ENGINES = [backend.get_serial_response, backend.get_concurrent_response]
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """Stubbed OpenAI and Infermedica; records the Infermedica calls made."""
+    calls = {"parse": 0, "diagnosis": 0, "openai": 0}
+    parse_started = threading.Event()
+    stubs = {"openai_reply": ANSWER, "parse_gate": None}
+
+    def openai_response(text, timeout=None, use_cache=True):
+        calls["openai"] += 1
+        if stubs["parse_gate"] is not None:
+            # Answer while /parse is in flight
+            parse_started.wait(5)
+        return stubs["openai_reply"]
+
+    def parse(text, sex, age, timeout=None):
+        parse_started.set()
+        if stubs["parse_gate"] is not None:
+            stubs["parse_gate"].wait(5)
+        calls["parse"] += 1
+        return {"mentions": [{"id": "s_21", "type": "symptom", "choice_id": "present"}]}
+
+    def diagnosis(evidence, sex, age, timeout=None):
+        calls["diagnosis"] += 1
+        return DIAGNOSIS
+
+    monkeypatch.setattr(backend, "get_openai_response", openai_response)
+    monkeypatch.setattr(infermedica_conversation, "get_openai_response", openai_response)
+    monkeypatch.setattr(infermedica_client, "is_configured", lambda: True)
+    monkeypatch.setattr(infermedica_client, "parse", parse)
+    monkeypatch.setattr(infermedica_client, "diagnosis", diagnosis)
+    monkeypatch.setattr(symptom_index, "resolve_message", lambda text, sex=None: None)
+    stubs["calls"] = calls
+    return stubs
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_acceptable_openai_answer_wins(engine, upstream):
+    text, followup, new_state = engine({"sex": "male", "age": 30}, "what helps with a cold?")
+    assert (text, followup, new_state) == (ANSWER, None, None)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_refusal_falls_back_to_infermedica(engine, upstream):
+    upstream["openai_reply"] = REFUSAL
+    state = {"sex": "male", "age": 30}
+    text, followup, new_state = engine(state, "I have a headache")
+    assert text.startswith("Based on your symptoms") and "Common cold" in text
+    assert followup is None
+    assert new_state["evidence"] == {"s_21": "p*"}
+    # The chat's own state is only replaced once the caller saves new_state
+    assert "evidence" not in state
+
+
+def test_serial_mode_does_not_call_infermedica_when_openai_answers(upstream):
+    backend.get_serial_response({}, "what helps with a cold?")
+    assert upstream["calls"]["parse"] == upstream["calls"]["diagnosis"] == 0
+
+
+def test_concurrent_mode_skips_diagnosis_once_openai_answered(upstream, monkeypatch):
+    executor = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(backend, "fanout_executor", executor)
+    upstream["parse_gate"] = gate = threading.Event()
+    result = backend.get_concurrent_response({"sex": "male", "age": 30}, "what helps with a cold?")
+    assert result == (ANSWER, None, None)
+    gate.set()
+    executor.shutdown(wait=True)
+    assert upstream["calls"]["parse"] == 1
+    assert upstream["calls"]["diagnosis"] == 0
+
+
+def test_concurrent_mode_sends_followup_answers_to_the_conversational_flow(upstream, monkeypatch):
+    seen = []
+    monkeypatch.setattr(
+        backend, "get_serial_response",
+        lambda *args, **kwargs: seen.append(args) or ("next question", {"text": "next question"}, None)
+    )
+    result = backend.get_concurrent_response({}, "yes", None, {"s_21": "present"}, "cb")
+    assert result == ("next question", {"text": "next question"}, None)
+    assert seen and seen[0][3] == {"s_21": "present"}
+    assert upstream["calls"]["parse"] == 0
@@ -0,0 +1,603 @@
+import io
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import shutil
+import tempfile
+import threading
+import subprocess
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Speech is stored in static/audio under a name derived from a hash of the
+# text and voice settings, so the same text is only synthesized once and the
+# files can be served as immutable. The directory is kept under
+# TTS_CACHE_MAX_BYTES by removing the least recently used files, and files
+# not used for TTS_CACHE_MAX_AGE_DAYS are removed as well.
+TTS_AUDIO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "audio")
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(100 * 1024 * 1024)))
+TTS_CACHE_MAX_AGE_DAYS = float(os.getenv("TTS_CACHE_MAX_AGE_DAYS", "30"))
+TTS_DEFAULT_LANG = os.getenv("TTS_LANG", "en")
+TTS_DEFAULT_TLD = os.getenv("TTS_TLD", "com")
+
+# Synthesis engine: "gtts" calls Google's TTS service over the network,
+# "espeak" runs espeak-ng locally (WAV output encoded to MP3 with ffmpeg),
+# which has no external dependency but sounds more robotic.
+TTS_ENGINE = os.getenv("TTS_ENGINE", "gtts").lower()
+ESPEAK_PATH = os.getenv("ESPEAK_PATH") or shutil.which("espeak-ng") or shutil.which("espeak")
+TTS_ESPEAK_VOICE = os.getenv("TTS_ESPEAK_VOICE")  # defaults to the language code
+TTS_ESPEAK_SPEED = int(os.getenv("TTS_ESPEAK_SPEED", "165"))  # words per minute
+TTS_ESPEAK_MP3_BITRATE = os.getenv("TTS_ESPEAK_MP3_BITRATE", "48k")
+
+# Speech for new AI messages is synthesized in the background right after
+# they are saved, on a small pool so it never delays a chat response
+TTS_PREGENERATE = os.getenv("TTS_PREGENERATE", "true").lower() == "true"
+TTS_WORKERS = int(os.getenv("TTS_WORKERS", "2"))
+
+# Long texts are split at sentence boundaries and the sentences synthesized
+# concurrently, TTS_CHUNK_WORKERS at a time, then joined (MP3 frames can be
+# concatenated as is). Each sentence is cached on its own as a chunk_ file,
+# so a repeated or partly edited reply only synthesizes the new sentences.
+TTS_CHUNKED = os.getenv("TTS_CHUNKED", "true").lower() == "true"
+TTS_CHUNK_WORKERS = int(os.getenv("TTS_CHUNK_WORKERS", "4"))
+# Sentences shorter than this are merged with the next one, to avoid one
+# synthesis call per "Yes." or list marker
+TTS_MIN_CHUNK_CHARS = int(os.getenv("TTS_MIN_CHUNK_CHARS", "40"))
+
+# Speech is synthesized as MP3. With ffmpeg available it can also be served
+# as Opus in an OGG container at TTS_OPUS_BITRATE, a fraction of the size,
+# for clients that ask for format "ogg".
+FFMPEG_PATH = os.getenv("FFMPEG_PATH") or shutil.which("ffmpeg")
+TTS_OPUS_BITRATE = os.getenv("TTS_OPUS_BITRATE", "24k")
+OPUS_OUTPUT_ARGS = ["-c:a", "libopus", "-b:a", TTS_OPUS_BITRATE, "-f", "ogg"]
+MIMETYPES = {"mp3": "audio/mpeg", "ogg": "audio/ogg"}
+STREAM_BLOCK_BYTES = 64 * 1024
+
+SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+|\n+")
+
+# Bump when a change to synthesis alters the audio for the same settings
+TTS_VERSION = "1"
+
+logger = logging.getLogger(__name__)
+
+# Requests for the same text wait for one synthesis instead of racing.
+# Chunks have their own locks: a thread holding a text lock waits on chunks.
+_key_locks = [threading.Lock() for _ in range(64)]
+_chunk_locks = [threading.Lock() for _ in range(64)]
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "chunk_hits": 0, "chunk_misses": 0, "evicted": 0}
+_executor = ThreadPoolExecutor(max_workers=TTS_WORKERS, thread_name_prefix="tts")
+_chunk_executor = ThreadPoolExecutor(max_workers=TTS_CHUNK_WORKERS, thread_name_prefix="tts-chunk")
+
+
+def voice_settings(lang=None, slow=False, tld=None, engine=None):
+    """The settings that change the synthesized audio, with defaults filled in."""
+    engine = (engine or TTS_ENGINE).lower()
+    if engine not in ENGINES:
+        logger.warning(f"Unknown TTS engine {engine!r}, using gtts")
+        engine = "gtts"
+    settings = {
+        "engine": engine,
+        "lang": lang or TTS_DEFAULT_LANG,
+        "slow": bool(slow),
+    }
+    if engine == "gtts":
+        settings["tld"] = tld or TTS_DEFAULT_TLD
+    else:
+        settings["voice"] = TTS_ESPEAK_VOICE or settings["lang"]
+        settings["speed"] = TTS_ESPEAK_SPEED * 2 // 3 if slow else TTS_ESPEAK_SPEED
+    return settings
+
+
+def audio_key(text, settings):
+    """Hash of the text and voice settings that names the cached file."""
+    payload = json.dumps([TTS_VERSION, text.strip(), settings], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def audio_filename(key, fmt="mp3"):
+    return f"tts_{key}.{fmt}"
+
+
+def resolve_format(fmt):
+    """The audio format to produce for a requested one, falling back to MP3."""
+    fmt = (fmt or "mp3").lower()
+    if fmt == "ogg" and not FFMPEG_PATH:
+        logger.warning("OGG/Opus requested but ffmpeg was not found, serving MP3")
+        return "mp3"
+    return fmt if fmt in MIMETYPES else "mp3"
+
+
+def chunk_filename(key):
+    return f"chunk_{key}.mp3"
+
+
+def _lock_for(key, locks=_key_locks):
+    return locks[int(key[:8], 16) % len(locks)]
+
+
+def _count(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+
+def split_sentences(text, min_chars=TTS_MIN_CHUNK_CHARS):
+    """Split text into sentence chunks, merging ones shorter than min_chars into the next."""
+    chunks = []
+    pending = ""
+    for sentence in SENTENCE_BREAK.split(text.strip()):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        pending = f"{pending} {sentence}" if pending else sentence
+        if len(pending) >= min_chars:
+            chunks.append(pending)
+            pending = ""
+    if pending:
+        if chunks and len(pending) < min_chars:
+            chunks[-1] = f"{chunks[-1]} {pending}"
+        else:
+            chunks.append(pending)
+    return chunks
+
+
+def _synthesize_gtts(text, settings):
+    from gtts import gTTS
+    buf = io.BytesIO()
+    gTTS(text=text, lang=settings["lang"], slow=settings["slow"], tld=settings["tld"]).write_to_fp(buf)
+    return buf.getvalue()
+
+
+def _synthesize_espeak(text, settings):
+    if not ESPEAK_PATH:
+        raise FileNotFoundError("espeak-ng was not found. Install it or set ESPEAK_PATH.")
+    if not FFMPEG_PATH:
+        raise FileNotFoundError("The espeak engine needs ffmpeg to encode MP3. Install it or set FFMPEG_PATH.")
+    # Text goes in on stdin, so it is never parsed as command line options
+    wav = subprocess.run(
+        [ESPEAK_PATH, "-v", settings["voice"], "-s", str(settings["speed"]), "--stdout"],
+        input=text.encode("utf-8"), capture_output=True, check=True
+    ).stdout
+    return _ffmpeg(wav, "wav", ["-c:a", "libmp3lame", "-b:a", TTS_ESPEAK_MP3_BITRATE, "-f", "mp3"])
+
+
+# Synthesis functions by engine name; each returns MP3 bytes
+ENGINES = {
+    "gtts": _synthesize_gtts,
+    "espeak": _synthesize_espeak,
+}
+
+
+def engine_available(engine):
+    """Whether the tools an engine needs are installed (gTTS also needs network access)."""
+    if engine == "espeak":
+        return bool(ESPEAK_PATH and FFMPEG_PATH)
+    try:
+        import gtts  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _synthesize(text, settings):
+    """Synthesize text with the engine named in settings and return the MP3 bytes."""
+    return ENGINES[settings["engine"]](text, settings)
+
+
+def _write_atomic(path, data):
+    # Write next to the final file and rename, so a half-written file is
+    # never served and concurrent requests never see a partial MP3
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _chunk_audio(sentence, settings):
+    """MP3 bytes for one sentence, from the chunk cache or freshly synthesized."""
+    key = audio_key(sentence, settings)
+    path = os.path.join(TTS_AUDIO_DIR, chunk_filename(key))
+    with _lock_for(key, _chunk_locks):
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+            _count("chunk_hits")
+            return data
+        except FileNotFoundError:
+            pass
+        data = _synthesize(sentence, settings)
+        _write_atomic(path, data)
+        _count("chunk_misses")
+        return data
+
+
+def _mp3_pieces(text, settings):
+    """
+    Yield the MP3 audio of text in order. With TTS_CHUNKED the sentences are
+    synthesized concurrently and each is yielded as soon as it and the ones
+    before it are ready.
+    """
+    sentences = split_sentences(text) if TTS_CHUNKED else []
+    if len(sentences) <= 1:
+        # Nothing to parallelize, and a chunk copy would only duplicate the file
+        yield _synthesize(text, settings)
+        return
+    futures = [_chunk_executor.submit(_chunk_audio, sentence, settings) for sentence in sentences]
+    try:
+        for future in futures:
+            yield future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def _ffmpeg_command(input_format, output_args):
+    return [FFMPEG_PATH, "-loglevel", "error", "-f", input_format, "-i", "pipe:0", *output_args, "pipe:1"]
+
+
+def _ffmpeg(data, input_format, output_args):
+    """Convert audio bytes with ffmpeg and return the output bytes."""
+    proc = subprocess.run(_ffmpeg_command(input_format, output_args), input=data, capture_output=True, check=True)
+    return proc.stdout
+
+
+def _to_ogg(mp3_data):
+    """Transcode MP3 bytes to Opus in OGG with ffmpeg."""
+    return _ffmpeg(mp3_data, "mp3", OPUS_OUTPUT_ARGS)
+
+
+def _to_ogg_stream(pieces):
+    """Transcode a stream of MP3 pieces to OGG/Opus, yielding output as ffmpeg produces it."""
+    proc = subprocess.Popen(_ffmpeg_command("mp3", OPUS_OUTPUT_ARGS), stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    errors = []
+
+    def feed():
+        try:
+            for piece in pieces:
+                proc.stdin.write(piece)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            try:
+                proc.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+    try:
+        for block in iter(lambda: proc.stdout.read1(STREAM_BLOCK_BYTES), b""):
+            yield block
+        proc.wait()
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+        feeder.join()
+    if errors:
+        raise errors[0]
+    if proc.returncode:
+        raise RuntimeError(f"ffmpeg exited with status {proc.returncode}")
+
+
+def _cached_mp3(text, settings, key):
+    """
+    MP3 bytes of the speech for key, read from the cache or synthesized and
+    cached. The caller holds the key lock. evict() may run in any worker and
+    does not take it, but once the file is open its bytes can still be read
+    after an unlink, and a file evicted before that is synthesized again.
+    """
+    path = os.path.join(TTS_AUDIO_DIR, audio_filename(key, "mp3"))
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        data = b"".join(_mp3_pieces(text, settings))
+        _write_atomic(path, data)
+        return data
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+    return data
+
+
+def get_speech(text, lang=None, slow=False, tld=None, fmt="mp3"):
+    """
+    Return the file name of the speech for text in TTS_AUDIO_DIR,
+    synthesizing it only if it is not cached yet.
+
+    Args:
+        fmt: "mp3", or "ogg" for Opus (falls back to MP3 without ffmpeg)
+
+    Returns:
+        tuple: (filename, cached)
+    """
+    fmt = resolve_format(fmt)
+    settings = voice_settings(lang, slow, tld)
+    key = audio_key(text, settings)
+    filename = audio_filename(key, fmt)
+    path = os.path.join(TTS_AUDIO_DIR, filename)
+
+    with _lock_for(key):
+        try:
+            # The modification time doubles as the last-used time for eviction
+            os.utime(path)
+            _count("hits")
+            return filename, True
+        except FileNotFoundError:
+            pass
+        os.makedirs(TTS_AUDIO_DIR, exist_ok=True)
+        start = time.perf_counter()
+        if fmt == "ogg":
+            # Transcoded from the cached MP3, which is synthesized first if needed
+            data = _to_ogg(_cached_mp3(text, settings, key))
+        else:
+            data = b"".join(_mp3_pieces(text, settings))
+        _write_atomic(path, data)
+        _count("misses")
+        logger.info(f"Synthesized {len(text)} chars of speech in {time.perf_counter() - start:.2f}s: {filename}")
+
+    evict()
+    return filename, False
+
+
+def stream_speech(text, lang=None, slow=False, tld=None, fmt="mp3"):
+    """
+    Speech for text as a stream of audio bytes.
+
+    A cached file is opened under the key lock and read back in blocks, so
+    an eviction after that cannot cut the stream short. Otherwise audio is
+    yielded sentence by sentence while it is synthesized, and the complete
+    file is cached once the stream ends, so the returned file name is valid
+    from then on. The key lock is held while synthesizing, so an identical
+    request that misses meanwhile streams the cached file instead of
+    synthesizing it again.
+
+    Returns:
+        tuple: (filename, mimetype, iterator of bytes)
+    """
+    fmt = resolve_format(fmt)
+    settings = voice_settings(lang, slow, tld)
+    key = audio_key(text, settings)
+    filename = audio_filename(key, fmt)
+    path = os.path.join(TTS_AUDIO_DIR, filename)
+
+    with _lock_for(key):
+        cached = _open_cached(path)
+    if cached is not None:
+        _count("hits")
+        return filename, MIMETYPES[fmt], _read_blocks(cached)
+
+    def generate():
+        with _lock_for(key):
+            # An identical request may have cached the audio while this one waited
+            cached = _open_cached(path)
+            if cached is None:
+                os.makedirs(TTS_AUDIO_DIR, exist_ok=True)
+                start = time.perf_counter()
+                pieces = _mp3_pieces(text, settings)
+                if fmt == "ogg":
+                    pieces = _to_ogg_stream(pieces)
+                data = []
+                for piece in pieces:
+                    data.append(piece)
+                    yield piece
+                _write_atomic(path, b"".join(data))
+                _count("misses")
+                logger.info(f"Streamed {len(text)} chars of speech in {time.perf_counter() - start:.2f}s: {filename}")
+        if cached is not None:
+            _count("hits")
+            yield from _read_blocks(cached)
+            return
+        evict()
+
+    return filename, MIMETYPES[fmt], generate()
+
+
+class SentenceSpeaker:
+    """
+    Speech for text that is still being generated.
+
+    feed() takes text deltas as they stream in. Every completed sentence
+    (grouped like split_sentences) is synthesized at once on the chunk pool
+    and cached as a chunk_ file. ready() returns the segments whose audio is
+    done, in order, and finish() flushes the trailing text and waits for the
+    rest. A segment is a dict with index, text and filename.
+    """
+
+    def __init__(self, lang=None, slow=False, min_chars=TTS_MIN_CHUNK_CHARS):
+        self.settings = voice_settings(lang, slow)
+        self.min_chars = min_chars
+        self._text = ""
+        self._pending = ""
+        self._futures = deque()
+        self._index = 0
+
+    def feed(self, delta):
+        self._text += delta
+        sentences = SENTENCE_BREAK.split(self._text)
+        # The last piece may still grow, so it waits for the next delta
+        self._text = sentences.pop()
+        for sentence in sentences:
+            sentence = sentence.strip()
+            if not sentence:
+                continue
+            self._pending = f"{self._pending} {sentence}" if self._pending else sentence
+            if len(self._pending) >= self.min_chars:
+                self._submit(self._pending)
+                self._pending = ""
+
+    def _submit(self, sentence):
+        future = _chunk_executor.submit(_sentence_file, sentence, self.settings)
+        self._futures.append((self._index, sentence, future))
+        self._index += 1
+
+    def _pop(self, timeout=None):
+        index, sentence, future = self._futures.popleft()
+        try:
+            return {"index": index, "text": sentence, "filename": future.result(timeout=timeout)}
+        except Exception as e:
+            logger.warning(f"Speech for segment {index} failed: {e}")
+            return None
+
+    def ready(self):
+        """Segments whose audio is done, stopping at the first one still running."""
+        segments = []
+        while self._futures and self._futures[0][2].done():
+            segment = self._pop()
+            if segment:
+                segments.append(segment)
+        return segments
+
+    def finish(self, timeout=None):
+        """Synthesize the trailing text and yield all remaining segments in order."""
+        rest = " ".join(part for part in (self._pending, self._text.strip()) if part)
+        self._pending = self._text = ""
+        if rest:
+            self._submit(rest)
+        while self._futures:
+            segment = self._pop(timeout)
+            if segment:
+                yield segment
+
+    def cancel(self):
+        """Drop the text and segments so far, e.g. when the answer is replaced."""
+        for _, _, future in self._futures:
+            future.cancel()
+        self._futures.clear()
+        self._pending = self._text = ""
+
+
+def _sentence_file(sentence, settings):
+    os.makedirs(TTS_AUDIO_DIR, exist_ok=True)
+    _chunk_audio(sentence, settings)
+    return chunk_filename(audio_key(sentence, settings))
+
+
+def _open_cached(path):
+    """
+    Open a cached audio file and mark it as used, or return None when it is
+    not cached. The caller holds the key lock; the open handle can still be
+    read if evict() unlinks the file afterwards.
+    """
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return None
+    try:
+        # The modification time doubles as the last-used time for eviction
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+    return f
+
+
+def _read_blocks(f):
+    with f:
+        for block in iter(lambda: f.read(STREAM_BLOCK_BYTES), b""):
+            yield block
+
+
+def is_cached(filename):
+    """Whether an audio file is still on disk (it may have been evicted)."""
+    return bool(filename) and os.path.exists(os.path.join(TTS_AUDIO_DIR, filename))
+
+
+def pregenerate(text, on_ready=None):
+    """
+    Synthesize speech for text in the background.
+
+    on_ready(filename) is called from the worker thread once the file exists.
+    Failures are logged and otherwise ignored: the client can still request
+    the speech through /api/tts.
+
+    Returns:
+        Future or None: None when pre-generation is disabled or text is empty
+    """
+    if not TTS_PREGENERATE or not text or not text.strip():
+        return None
+
+    def run():
+        try:
+            filename, _ = get_speech(text)
+        except Exception as e:
+            logger.warning(f"Background TTS failed: {e}")
+            return None
+        if on_ready:
+            try:
+                on_ready(filename)
+            except Exception as e:
+                logger.error(f"Saving background TTS result failed: {e}", exc_info=True)
+        return filename
+
+    return _executor.submit(run)
+
+
+def _audio_files():
+    files = []
+    try:
+        with os.scandir(TTS_AUDIO_DIR) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith((".mp3", ".ogg")):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+    except FileNotFoundError:
+        pass
+    return files
+
+
+def evict(max_bytes=None, max_age_days=None):
+    """
+    Remove audio files unused for max_age_days, then the least recently
+    used ones until the directory fits in max_bytes.
+
+    Returns:
+        int: Number of files removed
+    """
+    max_bytes = TTS_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    max_age_days = TTS_CACHE_MAX_AGE_DAYS if max_age_days is None else max_age_days
+    files = sorted(_audio_files())
+    total = sum(size for _, size, _ in files)
+    cutoff = time.time() - max_age_days * 86400 if max_age_days else None
+
+    removed = 0
+    freed = 0
+    for mtime, size, path in files:
+        if total - freed <= max_bytes and (cutoff is None or mtime >= cutoff):
+            break
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            continue
+        removed += 1
+        freed += size
+    if removed:
+        _count("evicted", removed)
+        logger.info(f"TTS cache evicted {removed} files ({freed} bytes)")
+    return removed
+
+
+def stats():
+    """Hit/miss counts of this process and the current size of the audio directory."""
+    files = _audio_files()
+    with _stats_lock:
+        counters = dict(_stats)
+    lookups = counters["hits"] + counters["misses"]
+    return {
+        "engine": TTS_ENGINE,
+        **counters,
+        "hit_rate": round(counters["hits"] / lookups, 4) if lookups else 0.0,
+        "files": len(files),
+        "bytes": sum(size for _, size, _ in files),
+        "max_bytes": TTS_CACHE_MAX_BYTES,
+    }
@@ -0,0 +1,146 @@
+import io
+import os
+import hashlib
+import logging
+import tempfile
+
+MB = 1024 * 1024
+
+# Uploads up to UPLOAD_SPOOL_MAX_BYTES stay in memory, larger ones are
+# streamed to a temp file in chunks. Each file type has its own size limit,
+# and PDFs also have a page limit. Both are checked before any extraction
+# work starts.
+UPLOAD_SPOOL_MAX_BYTES = int(os.getenv("UPLOAD_SPOOL_MAX_BYTES", str(2 * MB)))
+UPLOAD_CHUNK_BYTES = 64 * 1024
+UPLOAD_MAX_BYTES = {
+    "pdf": int(os.getenv("UPLOAD_MAX_PDF_BYTES", str(20 * MB))),
+    "image": int(os.getenv("UPLOAD_MAX_IMAGE_BYTES", str(15 * MB))),
+    "audio": int(os.getenv("UPLOAD_MAX_AUDIO_BYTES", str(25 * MB))),
+    "other": int(os.getenv("UPLOAD_MAX_OTHER_BYTES", str(1 * MB))),
+}
+UPLOAD_MAX_PDF_PAGES = int(os.getenv("UPLOAD_MAX_PDF_PAGES", "50"))
+
+FILE_KINDS = {
+    ".pdf": "pdf",
+    ".jpg": "image",
+    ".jpeg": "image",
+    ".png": "image",
+    ".wav": "audio",
+    ".mp3": "audio",
+    ".m4a": "audio",
+}
+
+logger = logging.getLogger(__name__)
+
+
+class UploadRejected(Exception):
+    """An upload broke a size or page limit; status_code is the HTTP status to return."""
+
+    def __init__(self, message, status_code=413):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class Upload:
+    """
+    An uploaded file held in memory, or in a temp file once it is too big.
+
+    Use it as a context manager, or call close(), to remove the temp file.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename.lower()
+        self.extension = os.path.splitext(self.filename)[-1]
+        self.kind = FILE_KINDS.get(self.extension, "other")
+        self.size = 0
+        self.digest = None
+        self.path = None
+        self._buffer = io.BytesIO()
+        self._file = None
+
+    def write(self, chunk):
+        if self._file is None and self._buffer.tell() + len(chunk) > UPLOAD_SPOOL_MAX_BYTES:
+            # Spill to disk, keeping what was buffered so far
+            self._file = tempfile.NamedTemporaryFile(delete=False, suffix=self.extension)
+            self.path = self._file.name
+            self._file.write(self._buffer.getvalue())
+            self._buffer = None
+        (self._file or self._buffer).write(chunk)
+
+    def finish(self):
+        if self._file is not None:
+            self._file.close()
+
+    def source(self):
+        """
+        What to hand to an extractor: the temp file path for large uploads, a
+        BytesIO positioned at the start for small ones.
+        """
+        if self.path:
+            return self.path
+        self._buffer.seek(0)
+        return self._buffer
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+        if self.path:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
+        self._buffer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def count_pdf_pages(source):
+    import PyPDF2
+    return len(PyPDF2.PdfReader(source).pages)
+
+
+def receive_upload(file_storage):
+    """
+    Read a werkzeug FileStorage in chunks into an Upload.
+
+    The SHA-256 of the contents is computed while reading. Raises
+    UploadRejected as soon as the file exceeds the size limit for its type,
+    or when a PDF has more than UPLOAD_MAX_PDF_PAGES pages.
+    """
+    upload = Upload(file_storage.filename or "")
+    limit = UPLOAD_MAX_BYTES[upload.kind]
+    digest = hashlib.sha256()
+    try:
+        while True:
+            chunk = file_storage.stream.read(UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+            upload.size += len(chunk)
+            if upload.size > limit:
+                raise UploadRejected(
+                    f"{upload.filename} is too large: {upload.kind} files are limited to {limit / MB:g} MB"
+                )
+            digest.update(chunk)
+            upload.write(chunk)
+        upload.finish()
+        upload.digest = digest.hexdigest()
+
+        if upload.kind == "pdf":
+            try:
+                pages = count_pdf_pages(upload.source())
+            except Exception as e:
+                raise UploadRejected(f"{upload.filename} is not a readable PDF: {e}", 400)
+            if pages > UPLOAD_MAX_PDF_PAGES:
+                raise UploadRejected(
+                    f"{upload.filename} has {pages} pages, the limit is {UPLOAD_MAX_PDF_PAGES}"
+                )
+        logger.info(f"Received upload {upload.filename} ({upload.size} bytes, {'disk' if upload.path else 'memory'})")
+        return upload
+    except BaseException:
+        upload.close()
+        raise
@@ -1,18 +1,19 @@
-import openai
-import pytesseract
-import speech_recognition as sr
-from PIL import Image
-import torch
-from transformers import BlipProcessor, BlipForConditionalGeneration
-import langdetect
-from deep_translator import GoogleTranslator
-import PyPDF2
 import logging
+import os
+import tempfile
+from concurrent.futures import as_completed
+import ocr
 
-def process_audio(file_path):
+# speech_recognition, PIL, PyPDF2, langdetect and deep_translator are imported
+# inside the functions that use them, so importing this module (and app.py)
+# stays cheap. Run `flask import-report` to see what the backend loads at boot.
+
+def process_audio(audio_source):
+    # audio_source is a file path or a binary file-like object
+    import speech_recognition as sr
     r = sr.Recognizer()
     try:
-        with sr.AudioFile(file_path) as source:
+        with sr.AudioFile(audio_source) as source:
             audio = r.record(source)
         return r.recognize_google(audio)
     except sr.UnknownValueError:
@@ -22,79 +23,177 @@ def process_audio(file_path):
     except Exception as e:
         return f"Audio processing error: {str(e)}"
 
-def process_image(image_path):
-    import pytesseract
-    from PIL import Image, ImageOps
-    import os
+def process_image(image_source):
+    # image_source is a file path or a binary file-like object
+    from PIL import Image
     import logging
-    # Make Tesseract path configurable via environment variable
-    #if os.name == 'nt':  # Windows
-        #pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
-    #else:  # Linux (Render)
-    tesseract_path = os.getenv("TESSERACT_PATH", "/usr/bin/tesseract")
-    pytesseract.pytesseract.tesseract_cmd = tesseract_path
+    from image_preprocessing import preprocess_for_ocr
+    image_path = image_source if isinstance(image_source, str) else "<upload>"
     try:
-        img = Image.open(image_path)
-        img = ImageOps.grayscale(img)
-        # Optionally allow threshold to be set via env var
-        threshold = int(os.getenv("OCR_THRESHOLD", "140"))
-        img = img.point(lambda x: 0 if x < threshold else 255, '1')
-        text = pytesseract.image_to_string(img)
+        img = Image.open(image_source)
+        # Downscale, binarize (Otsu by default) and check the image holds text
+        img, has_text = preprocess_for_ocr(img)
+        if not has_text:
+            logging.info(f"No text detected in image, skipping OCR: {image_path}")
+            return ""
+        text = ocr.image_to_string(img)
         logging.info(f"OCR extracted text: {text}")
         if not text.strip():
             logging.warning(f"OCR returned empty text for image: {image_path}")
         return text
     except FileNotFoundError:
-        logging.error(f"Tesseract executable not found at {tesseract_path}. Set TESSERACT_PATH environment variable correctly.")
-        return f"Tesseract executable not found at {tesseract_path}. Set TESSERACT_PATH environment variable correctly."
+        logging.error(f"Tesseract executable not found at {ocr.TESSERACT_PATH}. Set TESSERACT_PATH environment variable correctly.")
+        return f"Tesseract executable not found at {ocr.TESSERACT_PATH}. Set TESSERACT_PATH environment variable correctly."
     except Exception as e:
         logging.error(f"OCR error for image {image_path}: {str(e)}")
         return f"Image OCR error: {str(e)}"
 
 def detect_language(text):
     try:
+        import langdetect
         return langdetect.detect(text)
     except Exception:
         return "en"
 
 def translate_to_english(text):
     try:
-      
+        from deep_translator import GoogleTranslator
         return GoogleTranslator(source='auto', target='en').translate(text)
     except Exception:
         return text
 
-def extract_text_from_pdf(pdf_path):
+# PDF extraction settings: a page needs at least PDF_MIN_PAGE_CHARS characters
+# of embedded text to skip OCR; image-only pages are rasterized one at a time
+# at OCR_DPI (clamped to a sane range) and OCR'd on the ocr worker pool.
+PDF_MIN_PAGE_CHARS = int(os.getenv("PDF_MIN_PAGE_CHARS", "16"))
+OCR_DPI = min(max(int(os.getenv("OCR_DPI", "200")), 72), 300)
+
+def has_text_layer(page_text):
+    """Whether the embedded text of a page is enough to skip OCR."""
+    return len(page_text.strip()) >= PDF_MIN_PAGE_CHARS
+
+def extract_text_from_pdf(pdf_source, progress=None):
+    """
+    Extract text from a PDF, OCR-ing only the pages without a usable text layer.
+
+    Pages with embedded text are read directly. Image-only pages are
+    rasterized one page at a time at a bounded DPI and OCR'd in parallel
+    across CPU cores.
+
+    Args:
+        pdf_source: Path of the PDF file, or a binary file-like object
+        progress: Optional callback called as progress(done, total) in pages
+
+    Returns:
+        tuple: (text, complete) where text is the page texts joined in page
+        order and complete is False when the PDF could not be read or the
+        OCR of any page failed, so the text may be missing pages
+    """
+    import PyPDF2
     try:
-        import pytesseract
-        from PIL import Image
-        import io
-        with open(pdf_path, "rb") as f:
-            reader = PyPDF2.PdfReader(f)
-            text = ""
-            for page in reader.pages:
-                page_text = page.extract_text() or ""
-                text += page_text
-                # If no text, try OCR on page image
-                if not page_text.strip() and '/XObject' in page.get('/Resources', {}):
-                    xObject = page['/Resources']['/XObject'].get_object()
-                    for obj in xObject:
-                        if xObject[obj]['/Subtype'] == '/Image':
-                            data = xObject[obj]._data
-                            img = Image.open(io.BytesIO(data))
-                            ocr_text = pytesseract.image_to_string(img)
-                            text += ocr_text
-            # If still empty, try OCR on entire PDF as images (fallback)
-            if not text.strip():
+        if isinstance(pdf_source, str):
+            with open(pdf_source, "rb") as f:
+                page_texts = [page.extract_text() or "" for page in PyPDF2.PdfReader(f).pages]
+            ocr_input = pdf_source
+        else:
+            pdf_source.seek(0)
+            page_texts = [page.extract_text() or "" for page in PyPDF2.PdfReader(pdf_source).pages]
+            ocr_input = None
+    except Exception as e:
+        logging.error(f"PDF extraction error: {e}")
+        return "", False
+
+    total_pages = len(page_texts)
+    ocr_pages = [i for i, page_text in enumerate(page_texts) if not has_text_layer(page_text)]
+    done = total_pages - len(ocr_pages)
+    if progress:
+        progress(done, total_pages)
+
+    complete = True
+    if ocr_pages:
+        logging.info(f"OCR of {len(ocr_pages)}/{total_pages} image-only pages at {OCR_DPI} DPI")
+        temp_path = None
+        if ocr_input is None:
+            # Workers run in other processes. Sending them the PDF bytes would
+            # copy the whole file into every page task, so an in-memory upload
+            # is written to a temp file once and the tasks get its path
+            fd, temp_path = tempfile.mkstemp(suffix=".pdf")
+            with os.fdopen(fd, "wb") as f:
+                pdf_source.seek(0)
+                f.write(pdf_source.read())
+            ocr_input = temp_path
+        try:
+            futures = {
+                ocr.submit_pdf_page(ocr_input, i + 1, OCR_DPI): i
+                for i in ocr_pages
+            }
+            for future in as_completed(futures):
+                i = futures[future]
                 try:
-                    from pdf2image import convert_from_path
-                    images = convert_from_path(pdf_path)
-                    for img in images:
-                        ocr_text = pytesseract.image_to_string(img)
-                        text += ocr_text
+                    ocr_text = future.result()
+                    # Keep whatever embedded text the page had if OCR finds nothing
+                    if ocr_text.strip():
+                        page_texts[i] = ocr_text
                 except Exception as e:
-                    logging.warning(f"OCR fallback failed: {e}")
-            return text
+                    logging.warning(f"OCR of PDF page {i + 1} failed: {e}")
+                    complete = False
+                done += 1
+                if progress:
+                    progress(done, total_pages)
+        finally:
+            if temp_path:
+                os.unlink(temp_path)
+
+    return "\n".join(page_text for page_text in page_texts if page_text.strip()), complete
+
+def extract_text_from_file(source, filename, progress=None):
+    """
+    Extract text from an uploaded PDF, image or audio file.
+
+    Args:
+        source: Path of the saved upload, or a binary file-like object
+        filename: Original (lower-cased) file name, used to pick the extractor
+        progress: Optional callback called as progress(done, total)
+
+    Returns:
+        tuple: (text, complete) where text is the extracted text, an error
+        message, or '' for unsupported types, and complete is False when the
+        extraction failed in whole or in part
+    """
+    complete = True
+    try:
+        if filename.endswith('.pdf'):
+            text, complete = extract_text_from_pdf(source, progress=progress)
+            logging.info(f"PDF extraction result length: {len(text)} chars")
+            if not text.strip():
+                logging.warning(f"PDF extraction returned empty text for file: {filename}")
+        elif filename.endswith(('.jpg', '.jpeg', '.png')):
+            try:
+                text = process_image(source)
+                logging.info(f"Image OCR result length: {len(text)} chars")
+                if not text.strip():
+                    logging.warning(f"Image OCR returned empty text for file: {filename}")
+            except Exception as e:
+                logging.error(f"Image processing error: {str(e)}")
+                text = f"Image processing error: {str(e)}"
+                complete = False
+        elif filename.endswith(('.wav', '.mp3', '.m4a')):
+            try:
+                text = process_audio(source)
+                logging.info(f"Audio transcription result length: {len(text)} chars")
+                if not text.strip():
+                    logging.warning(f"Audio transcription returned empty text for file: {filename}")
+            except Exception as e:
+                logging.error(f"Audio processing error: {str(e)}")
+                text = f"Audio processing error: {str(e)}"
+                complete = False
+        else:
+            logging.warning(f"Unsupported file type: {filename}")
+            text = ''
     except Exception as e:
-        logging.error(f"PDF extraction error: {e}")
-        return ""
+        logging.error(f"General extraction error for file {filename}: {str(e)}", exc_info=True)
+        text = f"General extraction error: {str(e)}"
+        complete = False
+    if progress and not filename.endswith('.pdf'):
+        progress(1, 1)
+    return text, complete
@@ -1,4 +1,5 @@
 import streamlit as st
+import streamlit.components.v1 as components
 import time
 import requests
 import io
@@ -9,10 +10,14 @@ from PIL import Image
 from streamlit_realtime_audio_recorder import audio_recorder
 import base64
 import hashlib
+import json
 from pydub import AudioSegment
 
 # Constants
 BACKEND_URL = "https://flask-backend-xcc0.onrender.com/api"
+EXTRACT_JOB_TIMEOUT = 300  # Seconds to wait for a backend extraction job
+EXTRACT_JOB_POLL_WAIT = 15  # Seconds each long-poll may block on the backend
+TTS_AUDIO_FORMAT = os.getenv("TTS_AUDIO_FORMAT", "mp3")  # "ogg" asks for smaller Opus audio
 
 # CSS Styling (keeping your existing CSS)
 CHATGPT_CSS = """
@@ -258,6 +263,111 @@ def convert_audio_to_bytes(audio_data):
             st.error(f"Problematic audio_data type was: {type(audio_data)}")
         return None
 
+def run_extraction_job(files, headers, label="Extracting text...", backend_url=BACKEND_URL):
+    """
+    Submit a file to the backend extraction job queue and wait for its text.
+    
+    The upload returns a job id immediately; the job is then long-polled so
+    no single request has to outlive the proxy timeout.
+    
+    Args:
+        files: requests-style files dict with a single 'file' entry
+        headers: Authorization headers
+        label: Text shown next to the progress bar
+        backend_url: Base URL of the backend API
+    
+    Returns:
+        tuple: (text, error) where exactly one is None
+    """
+    res = requests.post(f"{backend_url}/utils/extract/jobs", files=files, headers=headers, timeout=60)
+    if res.status_code != 202:
+        try:
+            return None, res.json().get('error', res.text)
+        except ValueError:
+            return None, f"{res.status_code} - {res.text}"
+    job_id = res.json()['job_id']
+    
+    progress_bar = st.progress(0.0, text=label)
+    deadline = time.time() + EXTRACT_JOB_TIMEOUT
+    try:
+        while time.time() < deadline:
+            res = requests.get(
+                f"{backend_url}/utils/extract/jobs/{job_id}",
+                params={"wait": EXTRACT_JOB_POLL_WAIT},
+                headers=headers,
+                timeout=EXTRACT_JOB_POLL_WAIT + 10
+            )
+            if res.status_code != 200:
+                return None, f"Extraction job lookup failed: {res.status_code} - {res.text}"
+            job = res.json()
+            done, total = job['progress']['done'], job['progress']['total']
+            if total:
+                progress_bar.progress(min(done / total, 1.0), text=f"{label} ({done}/{total})")
+            if job['status'] == 'done':
+                return job.get('result') or '', None
+            if job['status'] == 'failed':
+                return None, job.get('error') or "Extraction failed"
+        return None, "Extraction timed out. Please try again."
+    finally:
+        progress_bar.empty()
+
+def get_file_bytes(uploaded_file):
+    """Return the raw bytes of an uploaded file without moving its read position."""
+    try:
+        if hasattr(uploaded_file, 'getvalue'):
+            return uploaded_file.getvalue()
+        if hasattr(uploaded_file, 'read'):
+            pos = uploaded_file.tell() if hasattr(uploaded_file, 'tell') else None
+            data = uploaded_file.read()
+            if pos is not None:
+                uploaded_file.seek(pos)
+            return data
+        if hasattr(uploaded_file, 'bytes'):
+            return uploaded_file.bytes
+        if isinstance(uploaded_file, bytes):
+            return uploaded_file
+        if isinstance(uploaded_file, str):
+            return uploaded_file.encode()
+    except Exception:
+        pass
+    return b''
+
+def stream_batch_extraction(uploaded_files, headers, backend_url=BACKEND_URL):
+    """
+    Send several files to the batch extraction endpoint in one request and
+    yield each file's result as soon as the backend has it.
+    
+    Yields:
+        dict: {'filename', 'text'} or {'filename', 'error'} per file
+    """
+    files = [
+        ('files', (f.name, get_file_bytes(f), getattr(f, 'type', 'application/octet-stream')))
+        for f in uploaded_files
+    ]
+    with st.spinner(f"Reading {len(files)} files..."):
+        with requests.post(
+            f"{backend_url}/utils/extract/batch",
+            files=files,
+            headers=headers,
+            stream=True,
+            timeout=(10, EXTRACT_JOB_TIMEOUT)
+        ) as res:
+            if res.status_code != 200:
+                try:
+                    error = res.json().get('error', res.text)
+                except ValueError:
+                    error = f"{res.status_code} - {res.text}"
+                for f in uploaded_files:
+                    yield {'filename': f.name, 'error': error}
+                return
+            for line in res.iter_lines(decode_unicode=True):
+                if not line:
+                    continue
+                result = json.loads(line)
+                if result.get('done'):
+                    break
+                yield result
+
 # Audio processing function
 def process_audio_and_get_transcription(audio_data, backend_url, auth_token):
     """Processes audio data and sends it to the backend for transcription."""
@@ -273,76 +383,154 @@ def process_audio_and_get_transcription(audio_data, backend_url, auth_token):
     st.info(f"Sending {len(wav_bytes)} bytes of WAV data for transcription.")
     files = {'file': ('audio.wav', wav_bytes, 'audio/wav')}
     headers = {"Authorization": f"Bearer {auth_token}"}
-    # Changed from /transcribe to /utils/extract to match the backend route
-    transcribe_url = f"{backend_url}/utils/extract" 
     
     try:
-        response = requests.post(transcribe_url, files=files, headers=headers)
-        response.raise_for_status()  # Raise an exception for bad status codes
-        try:
-            transcription_response = response.json()
-        except ValueError:
-            st.error(f"Backend returned invalid JSON. Raw response: {response.text}")
-            return None
-        if 'error' in transcription_response:
-            st.error(f"Backend error: {transcription_response['error']}")
+        text, error = run_extraction_job(files, headers, label="Transcribing audio...", backend_url=backend_url)
+        if error:
+            st.error(f"Backend error: {error}")
             return None
         st.success("Transcription received successfully.")
-        return transcription_response.get("text", "No transcription found in response.") 
+        return text or "No transcription found in response."
     except requests.exceptions.RequestException as e:
         st.error(f"Error sending audio for transcription: {str(e)}")
-        if hasattr(e, 'response') and e.response is not None:
-            try:
-                error_json = e.response.json()
-                if 'error' in error_json:
-                    st.error(f"Backend error: {error_json['error']}")
-            except Exception:
-                st.error(f"Backend response: {e.response.text}")
         return None
     except Exception as e:
         st.error(f"An unexpected error occurred during transcription request: {str(e)}")
         return None
 
-def send_message_to_ai(chat_id, message_content, headers):
+# Plays speech segments one after another. The player is installed once in
+# the parent page, so it keeps playing across reruns, and each segment is
+# queued by a zero-height component that calls into it.
+AUDIO_QUEUE_JS = """
+<script>
+(function () {
+  const page = window.parent;
+  if (!page.__ttsPlayer) {
+    const script = page.document.createElement("script");
+    script.textContent = `
+      window.__ttsPlayer = {
+        queue: [],
+        audio: null,
+        push(url) { this.queue.push(url); if (!this.audio) this.next(); },
+        next() {
+          const url = this.queue.shift();
+          if (!url) { this.audio = null; return; }
+          this.audio = new Audio(url);
+          this.audio.onended = () => this.next();
+          this.audio.onerror = () => this.next();
+          this.audio.play().catch(() => this.next());
+        },
+        clear() {
+          this.queue = [];
+          if (this.audio) { this.audio.pause(); this.audio = null; }
+        }
+      };`;
+    page.document.head.appendChild(script);
+  }
+  page.__ttsPlayer.__CALL__;
+})();
+</script>
+"""
+
+def queue_audio_segment(audio_url):
+    """Append a speech segment to the page's playback queue."""
+    components.html(AUDIO_QUEUE_JS.replace("__CALL__", f"push({json.dumps(audio_url)})"), height=0)
+
+def clear_audio_queue():
+    """Stop the current speech segment and drop the queued ones."""
+    components.html(AUDIO_QUEUE_JS.replace("__CALL__", "clear()"), height=0)
+
+def stream_message_to_ai(chat_id, message_content, headers, result, speak=False, audio_area=None):
     """
-    Send message to AI and get response
+    Send message to AI and yield the response text as it is generated.
+    
+    Reads the Server-Sent Events of the streaming message endpoint and yields
+    each text delta, so it can be passed straight to st.write_stream.
     
     Args:
         chat_id: Current chat ID
         message_content: The message to send
         headers: Authorization headers
-    
-    Returns:
-        tuple: (success, ai_response)
+        result: Dict filled with 'success', the final 'ai_message' and
+            'similar_to' once the backend has saved the reply
+        speak: Ask the backend to voice each sentence as it is generated and
+            queue the segments for playback
+        audio_area: Container the playback components are placed in
     """
+    result['success'] = False
+    result['ai_message'] = None
     try:
-        response = requests.post(
-            f"{BACKEND_URL}/chats/{chat_id}/message",
-            json={"content": message_content},
+        with requests.post(
+            f"{BACKEND_URL}/chats/{chat_id}/message/stream",
+            json={"content": message_content, "speak": speak},
             headers=headers,
-            timeout=30
-        )
-        
-        if response.status_code == 200:
-            ai_message = response.json().get('ai_message')
-            if ai_message:
-                return True, ai_message
-            else:
-                st.error("No AI response received. Please try again.")
-                return False, None
-        else:
-            st.error(f"AI request failed: {response.status_code} - {response.text}")
-            return False, None
+            stream=True,
+            # Only bounds the wait between chunks, not the whole generation
+            timeout=(10, 30)
+        ) as response:
+            if response.status_code != 200:
+                st.error(f"AI request failed: {response.status_code} - {response.text}")
+                return
             
+            event, data_lines = None, []
+            for line in response.iter_lines(decode_unicode=True):
+                if line:
+                    if line.startswith("event:"):
+                        event = line[len("event:"):].strip()
+                    elif line.startswith("data:"):
+                        data_lines.append(line[len("data:"):].strip())
+                    continue
+                if not data_lines:
+                    continue
+                
+                # A blank line ends the event
+                payload = json.loads("\n".join(data_lines))
+                if event is None and payload.get('delta'):
+                    yield payload['delta']
+                elif event == "replace":
+                    # The streamed answer was replaced by the backend
+                    if speak:
+                        with audio_area:
+                            clear_audio_queue()
+                    yield "\n\n" + payload.get('text', '')
+                elif event == "audio" and speak and payload.get('audio_url'):
+                    with audio_area:
+                        queue_audio_segment(payload['audio_url'])
+                elif event == "done":
+                    result['success'] = True
+                    result['ai_message'] = payload.get('ai_message')
+                    result['similar_to'] = payload.get('similar_to')
+                elif event == "error":
+                    st.error(f"AI request failed: {payload.get('error')}")
+                event, data_lines = None, []
+    
     except requests.exceptions.Timeout:
         st.error("AI request timed out. Please try again.")
-        return False, None
     except requests.exceptions.RequestException as e:
         st.error(f"Network error during AI request: {str(e)}")
-        return False, None
     except Exception as e:
         st.error(f"Error getting AI response: {str(e)}")
-        return False, None
+
+def stream_ai_reply(chat_id, message_content, headers, speak=False):
+    """
+    Render the AI reply in a chat bubble while it is being generated.
+    With speak, each sentence is also played as soon as it is voiced.
+    
+    Returns:
+        tuple: (success, ai_response)
+    """
+    result = {}
+    audio_area = st.container()
+    with st.chat_message("ai"):
+        st.write_stream(stream_message_to_ai(
+            chat_id, message_content, headers, result, speak=speak, audio_area=audio_area
+        ))
+        if result.get('similar_to'):
+            # The backend reused the answer to a question worded differently
+            st.caption(f"♻️ Answer reused from a similar question: \"{result['similar_to']['question']}\"")
+    if result.get('success') and result.get('ai_message'):
+        return True, result['ai_message']
+    return False, None
 
 def get_tts_audio(text, headers):
     """
@@ -358,7 +546,7 @@ def get_tts_audio(text, headers):
     try:
         tts_response = requests.post(
             f"{BACKEND_URL}/tts",  # BACKEND_URL is "http://127.0.0.1:5000/api"
-            json={'text': text},
+            json={'text': text, 'format': TTS_AUDIO_FORMAT},
             headers=headers,
             timeout=15
         )
@@ -387,6 +575,39 @@ def get_tts_audio(text, headers):
     except Exception as e:
         return None
 
+def tts_message_key(msg):
+    """
+    Key of a message in the client-side TTS cache: its database id, or a
+    hash of its text for messages returned without one.
+    """
+    if msg.get('id') is not None:
+        return f"id_{msg['id']}"
+    return f"text_{hashlib.md5(msg['content'].encode('utf-8')).hexdigest()}"
+
+def render_tts_control(msg, headers):
+    """
+    Show a play control for an AI message. The backend synthesizes speech
+    for new replies in the background and returns its URL with the message
+    once ready; otherwise speech is only requested when the user clicks, and
+    the URL is then kept in st.session_state.tts_audio_urls so redraws make
+    no TTS calls.
+
+    Args:
+        msg: Message dict as returned by the chat endpoint
+        headers: Authorization headers
+    """
+    key = tts_message_key(msg)
+    audio_url = msg.get('audio_url') or st.session_state.tts_audio_urls.get(key)
+    if audio_url is None and st.button("🔊 Listen", key=f"tts_{key}"):
+        with st.spinner("Preparing audio..."):
+            audio_url = get_tts_audio(msg['content'], headers)
+        if audio_url:
+            st.session_state.tts_audio_urls[key] = audio_url
+        else:
+            st.warning("Audio is not available for this message right now.")
+    if audio_url:
+        st.audio(audio_url)
+
 def generate_audio_hash(audio_data):
     """
     Generate a hash for audio data to detect changes
@@ -418,7 +639,7 @@ def render_input_bar():
     fixed at the center of the chat area.
     
     Returns:
-        tuple: (audio_bytes, uploaded_file, send_clicked) 
+        tuple: (audio_bytes, uploaded_files, accept_file, send_clicked, user_message)
     """
     # Chat input area with embedded audio recorder and file upload
     with st.container():
@@ -458,26 +679,27 @@ def render_input_bar():
                         st.session_state.show_audio_preview = False
                         st.rerun()
 
-        # Preview file before sending (only for files uploaded via chat_input)
-        uploaded_file = None
+        # Preview files before sending (only for files uploaded via chat_input)
+        uploaded_files = []
         if hasattr(user_message, 'files') and user_message.files:
             chat_files = user_message.files
             if isinstance(chat_files, list) and len(chat_files) > 0:
-                uploaded_file = chat_files[0]
+                uploaded_files = chat_files
                 st.markdown('<div class="preview-container">', unsafe_allow_html=True)
-                if uploaded_file.type.startswith("image"):
-                    st.image(uploaded_file, width=120)
-                elif uploaded_file.type.startswith("audio"):
-                    st.audio(uploaded_file)
-                else:
-                    st.success(f"File '{uploaded_file.name}' ready to send.")
+                for uploaded_file in uploaded_files:
+                    if uploaded_file.type.startswith("image"):
+                        st.image(uploaded_file, width=120)
+                    elif uploaded_file.type.startswith("audio"):
+                        st.audio(uploaded_file)
+                    else:
+                        st.success(f"File '{uploaded_file.name}' ready to send.")
                 st.markdown('</div>', unsafe_allow_html=True)
-                st.toast(f"File '{uploaded_file.name}' uploaded.")
+                st.toast(f"{len(uploaded_files)} file(s) uploaded.")
     
         send_clicked = user_message is not None
         accept_file = hasattr(user_message, 'files') and bool(user_message.files)
         st.markdown('</div>', unsafe_allow_html=True)
-    return audio_bytes, uploaded_file, accept_file, send_clicked, user_message
+    return audio_bytes, uploaded_files, accept_file, send_clicked, user_message
 
 # Main Render Function
 def render(auth_token=None):
@@ -497,6 +719,8 @@ def render(auth_token=None):
         st.session_state.recording_active = False
     if 'last_processed_audio_id' not in st.session_state: 
         st.session_state.last_processed_audio_id = None
+    if 'tts_audio_urls' not in st.session_state:
+        st.session_state.tts_audio_urls = {}
     if "user_text_input" not in st.session_state: # Ensure user_text_input is initialized
         pass  # No assignment needed, placeholder to fix indentation
 
@@ -625,11 +849,9 @@ def render(auth_token=None):
                     elif msg['file_url'].endswith(('.wav', '.mp3')):
                         st.audio(msg['file_url'])
                     st.markdown('</div>', unsafe_allow_html=True)
-                # Add TTS for AI messages
+                # Speech for AI messages is fetched on demand
                 if msg['sender'] == 'ai':
-                    audio_url = get_tts_audio(msg['content'], headers)
-                    if audio_url:
-                        st.audio(audio_url)
+                    render_tts_control(msg, headers)
                 st.markdown('</div>', unsafe_allow_html=True)
         else:
             st.markdown("<div class='message-bubble ai'>👋 Welcome! Start a new chat or send a message to begin.</div>", unsafe_allow_html=True)
@@ -637,7 +859,7 @@ def render(auth_token=None):
         st.markdown('</div>', unsafe_allow_html=True)
         
         # Render input bar - user_text is no longer returned directly
-        audio_bytes, uploaded_file, accept_file, send_clicked, user_message = render_input_bar()
+        audio_bytes, uploaded_files, accept_file, send_clicked, user_message = render_input_bar()
         
         # Handle audio input (process only once per unique audio using hash)
         if audio_bytes is not None and len(audio_bytes) > 0:
@@ -684,17 +906,14 @@ def render(auth_token=None):
                         if transcribed_text:
                             with st.chat_message("user"):
                                 st.write(transcribed_text)
-                            ai_success, ai_response = send_message_to_ai(
+                            # Voice users hear the reply while it is still being generated
+                            ai_success, ai_response = stream_ai_reply(
                                 st.session_state.selected_chat_id,
                                 transcribed_text,
-                                headers
+                                headers,
+                                speak=True
                             )
                             if ai_success and ai_response:
-                                with st.chat_message("ai"):
-                                    st.write(ai_response)
-                                    audio_url = get_tts_audio(ai_response, headers)
-                                    if audio_url:
-                                        st.audio(audio_url)
                                 maybe_generate_chat_title(
                                     st.session_state.selected_chat_id,
                                     transcribed_text,
@@ -708,45 +927,13 @@ def render(auth_token=None):
                 else:
                     st.session_state.recording_active = False
         
-        # Handle file upload from st.file_uploader or st.chat_input
-        file_to_process = None
-        file_name = None
-        file_type = None
-        # Priority: file_uploader widget
-        if uploaded_file is not None and hasattr(uploaded_file, 'name'):
-            file_to_process = uploaded_file
-            file_name = uploaded_file.name
-            file_type = getattr(uploaded_file, 'type', 'application/octet-stream')
-        # If no file from uploader, check chat_input files
-        elif hasattr(user_message, 'files') and user_message.files:
-            # user_message.files is a list of UploadedFile objects
-            chat_files = user_message.files
-            if isinstance(chat_files, list) and len(chat_files) > 0:
-                file_to_process = chat_files[0]
-                file_name = file_to_process.name
-                file_type = getattr(file_to_process, 'type', 'application/octet-stream')
-        # Process the file if found (only once per unique file using hash)
-        if file_to_process is not None and hasattr(file_to_process, 'name'):
-            import hashlib
-            file_bytes_for_hash = b''
-            try:
-                if hasattr(file_to_process, 'getvalue'):
-                    file_bytes_for_hash = file_to_process.getvalue()
-                elif hasattr(file_to_process, 'read'):
-                    pos = file_to_process.tell() if hasattr(file_to_process, 'tell') else None
-                    file_bytes_for_hash = file_to_process.read()
-                    if pos is not None:
-                        file_to_process.seek(pos)
-                elif hasattr(file_to_process, 'bytes'):
-                    file_bytes_for_hash = file_to_process.bytes
-                elif isinstance(file_to_process, bytes):
-                    file_bytes_for_hash = file_to_process
-                elif isinstance(file_to_process, str):
-                    file_bytes_for_hash = file_to_process.encode()
-            except Exception:
-                file_bytes_for_hash = b''
-            file_hash = hashlib.md5(file_bytes_for_hash).hexdigest()
-            file_id = f"{file_name}_{file_hash}"
+        # Handle files attached via st.chat_input; all of them go to the backend in one call
+        files_to_process = [f for f in uploaded_files if hasattr(f, 'name')]
+        # Process the files if found (only once per unique set of files using hashes)
+        if files_to_process:
+            file_id = "|".join(
+                f"{f.name}_{hashlib.md5(get_file_bytes(f)).hexdigest()}" for f in files_to_process
+            )
             if 'processed_file_ids' not in st.session_state:
                 st.session_state.processed_file_ids = set()
             if file_id not in st.session_state.processed_file_ids:
@@ -754,38 +941,44 @@ def render(auth_token=None):
                 if ensure_chat_exists():
                     try:
                         st.session_state.last_processed_audio_id = None
-                        files = {'file': (file_name, file_to_process, file_type)}
-                        res = requests.post(f"{BACKEND_URL}/utils/extract", files=files, headers=headers)
-                        if res.status_code == 200:
-                            content = res.json().get('text', '')
-                            if content:
+                        extracted = []
+                        if len(files_to_process) == 1:
+                            # A single file goes through the job queue, which suits long scans
+                            file_to_process = files_to_process[0]
+                            file_name = file_to_process.name
+                            file_type = getattr(file_to_process, 'type', 'application/octet-stream')
+                            files = {'file': (file_name, file_to_process, file_type)}
+                            text, error = run_extraction_job(files, headers, label=f"Reading {file_name}...")
+                            results = [{'filename': file_name, 'text': text, 'error': error}]
+                        else:
+                            results = stream_batch_extraction(files_to_process, headers)
+                        for result in results:
+                            if result.get('error'):
+                                st.error(f"File processing failed for {result['filename']}: {result['error']}")
+                            elif result.get('text'):
                                 with st.chat_message("user"):
-                                    st.write(f"*Uploaded file: {file_name}*")
-                                    st.write(content)
-                                ai_success, ai_response = send_message_to_ai(
+                                    st.write(f"*Uploaded file: {result['filename']}*")
+                                    st.write(result['text'])
+                                extracted.append(result)
+                            else:
+                                st.error(f"No content returned from backend for uploaded file {result['filename']}.")
+                        if extracted:
+                            if len(extracted) == 1:
+                                content = extracted[0]['text']
+                            else:
+                                content = "\n\n".join(f"{r['filename']}:\n{r['text']}" for r in extracted)
+                            ai_success, ai_response = stream_ai_reply(
+                                st.session_state.selected_chat_id,
+                                content,
+                                headers
+                            )
+                            if ai_success and ai_response:
+                                maybe_generate_chat_title(
                                     st.session_state.selected_chat_id,
                                     content,
                                     headers
                                 )
-                                if ai_success and ai_response:
-                                    with st.chat_message("ai"):
-                                        st.write(ai_response)
-                                        audio_url = get_tts_audio(ai_response, headers)
-                                        if audio_url:
-                                            st.audio(audio_url)
-                                    maybe_generate_chat_title(
-                                        st.session_state.selected_chat_id,
-                                        content,
-                                        headers
-                                    )
-                                st.rerun()
-                            else:
-                                st.error("No content returned from backend for uploaded file.")
-                        else:
-                            try:
-                                st.error(f"File processing failed: {res.status_code} - {res.text}")
-                            except Exception:
-                                st.error(f"File processing failed: {res.status_code}")
+                            st.rerun()
                     except Exception as e:
                         st.error(f"Error processing file: {str(e)}")
         
@@ -808,30 +1001,20 @@ def render(auth_token=None):
                             content_en = translated
                 except Exception as e:
                     st.warning(f"Translation API error: {e}")
-                # Append user message to local messages list
-                messages.append({'sender': 'user', 'content': content})
-                ai_success, ai_response = send_message_to_ai(
+                with st.chat_message("user", avatar="👤"):
+                    st.write(content)
+                # Stream the AI response into the page as it is generated
+                ai_success, ai_response = stream_ai_reply(
                     st.session_state.selected_chat_id,
                     content_en,
                     headers
                 )
                 if ai_success and ai_response:
-                    # Append AI response to local messages list
-                    messages.append({'sender': 'ai', 'content': ai_response})
                     maybe_generate_chat_title(
                         st.session_state.selected_chat_id, 
                         content, 
                         headers
                     )
-                # Display all messages including new ones before rerun
-                for msg_idx, msg in enumerate(messages):
-                    avatar = "👤" if msg['sender'] == 'user' else "🤖"
-                    with st.chat_message(msg['sender'], avatar=avatar):
-                        st.write(msg['content'])
-                        if msg['sender'] == 'ai':
-                            audio_url = get_tts_audio(msg['content'], headers)
-                            if audio_url:
-                                st.audio(audio_url)
                 # st.session_state.user_text_input = "" # Now handled by on_change callback
                 st.rerun()
         
@@ -1,39 +1,210 @@
 import streamlit as st
 import pandas as pd
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 
-def get_symptom_ids(symptom_text, headers, age_value_str):
-    symptoms = []
-    phrases = [phrase.strip() for phrase in symptom_text.lower().replace(" and ", ",").replace(" or ", ",").split(",")]
+INFERMEDICA_API_URL = "https://api.infermedica.com/v3"
+# (connect, read) timeouts of each Infermedica request
+INFERMEDICA_TIMEOUT = (3.05, 15)
+# Symptom phrases searched in parallel; also the size of the connection pool
+SEARCH_WORKERS = 8
+# Streamlit reruns the Review step on every interaction; searches and the
+# diagnosis for the same inputs are reused for this long
+RESULTS_TTL = 3600
+# Autocomplete for the "Primary Symptom" field starts after this many characters
+SUGGEST_MIN_CHARS = 2
+SUGGEST_LIMIT = 6
 
+class SymptomSearchError(Exception):
+    """Some symptom searches failed; symptoms holds what was found anyway."""
+
+    def __init__(self, symptoms, errors):
+        super().__init__("; ".join(errors))
+        self.symptoms = symptoms
+        self.errors = errors
+
+@st.cache_data(ttl=RESULTS_TTL, show_spinner=False)
+def suggest_symptoms(backend_url, prefix, sex=None):
+    """
+    Symptom names starting with prefix, from the backend's local symptom index.
+
+    Args:
+        backend_url: Base URL of the backend API
+        prefix: What the user has typed of the symptom so far
+        sex: "male" or "female" to leave out symptoms of the other sex
+
+    Returns:
+        list: dicts with "id" and "name", empty when the backend cannot be reached
+    """
+    try:
+        res = requests.get(
+            f"{backend_url}/symptoms/suggest",
+            params={"q": prefix, "limit": SUGGEST_LIMIT, "sex": sex or ""},
+            timeout=3
+        )
+        if res.status_code == 200:
+            return res.json().get("suggestions", [])
+    except requests.RequestException:
+        pass
+    return []
+
+def match_symptoms_locally(backend_url, phrases, sex=None):
+    """
+    Resolve symptom phrases with the backend's local symptom index.
+
+    Args:
+        backend_url: Base URL of the backend API
+        phrases: Symptom phrases, e.g. ["headache", "sore throat"]
+        sex: "male" or "female"
+
+    Returns:
+        tuple: (matches, unresolved) where matches maps phrases to symptom ids
+        and unresolved lists the phrases that need an Infermedica search
+    """
+    if not backend_url or not phrases:
+        return {}, list(phrases)
+    try:
+        res = requests.post(f"{backend_url}/symptoms/match", json={"phrases": phrases, "sex": sex}, timeout=5)
+        if res.status_code == 200:
+            data = res.json()
+            return {phrase: match["id"] for phrase, match in data["matches"].items()}, data["unresolved"]
+    except (requests.RequestException, ValueError, KeyError):
+        pass
+    return {}, list(phrases)
+
+def normalize_phrases(symptom_text):
+    """
+    Split symptom text on commas, "and" and "or" into a sorted tuple of
+    distinct lowercase phrases, so the same symptoms typed in another order
+    or spacing share one cache entry.
+    """
+    text = " ".join(symptom_text.lower().split())
+    phrases = (phrase.strip() for phrase in text.replace(" and ", ",").replace(" or ", ",").split(","))
+    return tuple(sorted({phrase for phrase in phrases if phrase}))
+
+@st.cache_resource
+def get_infermedica_session():
+    """Keep-alive session shared by all reruns, sized for the concurrent searches."""
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=SEARCH_WORKERS))
+    return session
+
+def search_symptom(phrase, age_value, headers):
+    """
+    Search Infermedica for one symptom phrase.
+
+    Returns:
+        tuple: (symptom_id, error) where symptom_id is None when nothing was
+        found and error is None unless the request failed
+    """
+    try:
+        response = get_infermedica_session().get(
+            f"{INFERMEDICA_API_URL}/search",
+            headers=headers,
+            params={
+                "phrase": phrase,
+                "types": "symptom",
+                "age.value": age_value
+            },
+            timeout=INFERMEDICA_TIMEOUT
+        )
+    except requests.RequestException as e:
+        return None, f"Exception searching '{phrase}': {str(e)}"
+    if response.status_code != 200:
+        return None, f"❌ Error searching for symptom '{phrase}': {response.status_code} - {response.text}"
+    try:
+        results = response.json()
+    except ValueError as e:
+        return None, f"Exception searching '{phrase}': {str(e)}"
+    return (results[0]["id"] if results else None), None
+
+@st.cache_data(ttl=RESULTS_TTL, show_spinner=False)
+def resolve_symptoms(phrases, age_value, sex, backend_url, _headers):
+    """
+    Symptom evidence for normalized phrases: the backend's local index
+    first, then one concurrent Infermedica search per remaining phrase.
+
+    Raises:
+        SymptomSearchError: when a search failed, so the result is not cached
+    """
+    matches, unresolved = match_symptoms_locally(backend_url, list(phrases), sex)
+    errors = []
+    if unresolved:
+        with ThreadPoolExecutor(max_workers=min(SEARCH_WORKERS, len(unresolved))) as pool:
+            results = pool.map(lambda phrase: search_symptom(phrase, age_value, _headers), unresolved)
+            for phrase, (symptom_id, error) in zip(unresolved, results):
+                if symptom_id:
+                    matches[phrase] = symptom_id
+                if error:
+                    errors.append(error)
+    symptom_ids = dict.fromkeys(matches[phrase] for phrase in phrases if phrase in matches)
+    symptoms = [{"id": symptom_id, "choice_id": "present"} for symptom_id in symptom_ids]
+    if errors:
+        raise SymptomSearchError(symptoms, errors)
+    return symptoms
+
+def get_symptom_ids(symptom_text, headers, age_value_str, backend_url=None, sex=None):
     try:
         age_value = int(age_value_str)
     except ValueError:
         st.error("Invalid age format provided for symptom search.")
         return []
 
-    for phrase in phrases:
-        if not phrase:
-            continue
-        try:
-            response = requests.get(
-                "https://api.infermedica.com/v3/search",
-                headers=headers,
-                params={
-                    "phrase": phrase,
-                    "types": "symptom",
-                    "age.value": age_value
-                }
-            )
-            if response.status_code == 200:
-                results = response.json()
-                if results:
-                    symptoms.append({"id": results[0]["id"], "choice_id": "present"})
-            else:
-                st.error(f"❌ Error searching for symptom '{phrase}': {response.status_code} - {response.text}")
-        except Exception as e:
-            st.error(f"Exception searching '{phrase}': {str(e)}")
-    return symptoms
+    try:
+        return resolve_symptoms(normalize_phrases(symptom_text), age_value, sex, backend_url, headers)
+    except SymptomSearchError as e:
+        for error in e.errors:
+            st.error(error)
+        return e.symptoms
+
+@st.cache_data(ttl=RESULTS_TTL, show_spinner=False)
+def get_diagnosis(sex, age_value, symptom_ids, _headers):
+    """
+    Infermedica conditions for a sex, age and sorted tuple of present symptoms.
+
+    Raises:
+        requests.RequestException: when the request fails, so nothing is cached
+    """
+    payload = {
+        "sex": sex,
+        "age": {"value": age_value},
+        "evidence": [{"id": symptom_id, "choice_id": "present"} for symptom_id in symptom_ids]
+    }
+    response = get_infermedica_session().post(
+        f"{INFERMEDICA_API_URL}/diagnosis", json=payload, headers=_headers, timeout=INFERMEDICA_TIMEOUT
+    )
+    if response.status_code != 200:
+        raise requests.HTTPError(
+            f"Failed to retrieve diagnosis from Infermedica API: {response.status_code} - {response.text}",
+            response=response
+        )
+    return response.json().get("conditions", [])
+
+def symptom_input(field, backend_url=None, sex=None):
+    """
+    Text input for the "Primary Symptom" field with suggestions for the
+    symptom being typed (the part after the last comma).
+
+    Returns:
+        str: the field value
+    """
+    value = st.text_input(field, value=st.session_state.form_data.get(field, ""))
+    *done, current = value.split(",")
+    current = current.strip()
+    if not backend_url or len(current) < SUGGEST_MIN_CHARS:
+        return value
+
+    suggestions = [s for s in suggest_symptoms(backend_url, current.lower(), sex) if s["name"].lower() != current.lower()]
+    if suggestions:
+        st.caption("Did you mean:")
+        cols = st.columns(len(suggestions))
+        for i, suggestion in enumerate(suggestions):
+            with cols[i]:
+                if st.button(suggestion["name"], key=f"symptom_suggestion_{suggestion['id']}"):
+                    st.session_state.form_data[field] = ", ".join([*(part.strip() for part in done), suggestion["name"]])
+                    st.rerun()
+    return value
 
 # Modified render signature: Removed auth_token and on_logout_callback
 def render(backend_url=None, on_navigate=None):
@@ -45,10 +216,10 @@ def render(backend_url=None, on_navigate=None):
     }
     
     # Removed is_user_logged_in from main's call
-    main(headers=headers, on_navigate_callback=on_navigate)
+    main(headers=headers, on_navigate_callback=on_navigate, backend_url=backend_url)
 
 # Modified main signature: Removed is_user_logged_in
-def main(headers=None, on_navigate_callback=None):
+def main(headers=None, on_navigate_callback=None, backend_url=None):
     st.title("Medical Diagnosis Wizard")
 
     default_form_data = {
@@ -125,6 +296,10 @@ def main(headers=None, on_navigate_callback=None):
                     field, options=["Mild", "Moderate", "Severe", "Very Severe"],
                     value=st.session_state.form_data.get(field, "Moderate")
                 )
+            elif field == "Primary Symptom":
+                st.session_state.form_data[field] = symptom_input(
+                    field, backend_url, st.session_state.form_data.get("Gender", "").lower() or None
+                )
             else:
                 st.session_state.form_data[field] = st.text_input(field, value=st.session_state.form_data.get(field, ""))
     else: # Review & Results step
@@ -162,27 +337,21 @@ def main(headers=None, on_navigate_callback=None):
                 st.warning("Primary symptom is missing. Please go back and enter your main symptom.")
                 return
 
-            evidence = get_symptom_ids(primary_symptom_text, headers, age_str)
+            evidence = get_symptom_ids(primary_symptom_text, headers, age_str, backend_url=backend_url, sex=gender)
 
             if not evidence:
                 st.warning("No valid symptoms found based on your input. Try rephrasing or using common medical terms like 'headache', 'fever', etc.")
             else:
-                payload = {
-                    "sex": gender,
-                    "age": {"value": age_value},
-                    "evidence": evidence
-                }
                 try:
-                    response = requests.post("https://api.infermedica.com/v3/diagnosis", json=payload, headers=headers)
-                    if response.status_code == 200:
-                        conditions = response.json().get("conditions", [])
-                        if conditions:
-                            for i, condition in enumerate(conditions[:5]): 
-                                st.markdown(f"**{i+1}. {condition['name']}** - Probability: {round(condition['probability']*100, 2)}%")
-                        else:
-                            st.info("No specific conditions were identified based on the provided symptoms.")
+                    symptom_ids = tuple(sorted(item["id"] for item in evidence))
+                    conditions = get_diagnosis(gender, age_value, symptom_ids, headers)
+                    if conditions:
+                        for i, condition in enumerate(conditions[:5]): 
+                            st.markdown(f"**{i+1}. {condition['name']}** - Probability: {round(condition['probability']*100, 2)}%")
                     else:
-                        st.error(f"Failed to retrieve diagnosis from Infermedica API: {response.status_code} - {response.text}")
+                        st.info("No specific conditions were identified based on the provided symptoms.")
+                except requests.HTTPError as e:
+                    st.error(str(e))
                 except Exception as e:
                     st.error(f"Error connecting to Infermedica API: {str(e)}")
         